@@ -0,0 +1,170 @@
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+from typing import Optional, Tuple, List, Dict, Any
+
+# ---------- master_data_repository helpers ----------
+# master_data_repository records one row per ingested Data_Set_ table. Uploads are
+# fingerprinted by a hash of their bytes so identical content maps back to the
+# table that already holds it, whatever the file is called.
+
+def ensure_master_repository(cur):
+    """Create master_data_repository (and later-added columns) if missing."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS master_data_repository (
+            file_name VARCHAR(255) PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            row_count INTEGER
+        )
+    """)
+    cur.execute("ALTER TABLE master_data_repository ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    cur.execute("ALTER TABLE master_data_repository ADD COLUMN IF NOT EXISTS last_queried_at TIMESTAMP")
+    # position of the sheet in its workbook; NULL for single-table uploads
+    cur.execute("ALTER TABLE master_data_repository ADD COLUMN IF NOT EXISTS sheet_index INTEGER")
+    # bumped by every re-ingest and append; query-time caches key on it
+    cur.execute("ALTER TABLE master_data_repository ADD COLUMN IF NOT EXISTS version BIGINT DEFAULT 1")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS master_data_repository_content_hash_idx
+        ON master_data_repository (content_hash)
+    """)
+
+def find_datasets_by_hash(cur, content_hash: str) -> List[Tuple[str, int]]:
+    """
+    Return [(table_name, row_count)] of live tables ingested from identical
+    bytes; several when the upload was a multi-sheet workbook, in sheet order
+    so the first is the table the original upload reported.
+    """
+    cur.execute("""
+        SELECT file_name, row_count
+        FROM master_data_repository
+        WHERE content_hash = %s
+          AND to_regclass(format('%%I', file_name)) IS NOT NULL
+        ORDER BY sheet_index, created_at, file_name
+    """, (content_hash,))
+    return [(name, int(rows or 0)) for name, rows in cur.fetchall()]
+
+def register_dataset(cur, table_name: str, row_count: int, content_hash: Optional[str] = None,
+                     sheet_index: Optional[int] = None):
+    """Insert or replace the master_data_repository entry for a freshly ingested table."""
+    cur.execute("""
+        INSERT INTO master_data_repository (file_name, row_count, created_at, content_hash, sheet_index)
+        VALUES (%s, %s, CURRENT_TIMESTAMP, %s, %s)
+        ON CONFLICT (file_name) DO UPDATE
+        SET row_count = EXCLUDED.row_count,
+            created_at = EXCLUDED.created_at,
+            content_hash = EXCLUDED.content_hash,
+            sheet_index = EXCLUDED.sheet_index,
+            version = COALESCE(master_data_repository.version, 1) + 1
+    """, (table_name, row_count, content_hash, sheet_index))
+
+def record_append(cur, table_name: str, rows_inserted: int) -> int:
+    """
+    Bump the row count of an appended dataset and return the new total. The
+    content hash is cleared because the table no longer mirrors one upload.
+    """
+    cur.execute("""
+        UPDATE master_data_repository
+        SET row_count = row_count + %s,
+            content_hash = NULL,
+            version = COALESCE(version, 1) + 1
+        WHERE file_name = %s
+        RETURNING row_count
+    """, (rows_inserted, table_name))
+    row = cur.fetchone()
+    if row:
+        return int(row[0])
+    # table predates the repository entry: count it once and register it
+    cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
+    total = int(cur.fetchone()[0])
+    register_dataset(cur, table_name, total)
+    return total
+
+async def aget_dataset_version(cur, table_name: str) -> Optional[str]:
+    """
+    Opaque version of a dataset for cache keys (psycopg 3 async cursor):
+    changes whenever the table is re-ingested or appended to. None for
+    tables without a repository entry.
+    """
+    await cur.execute(
+        "SELECT version, created_at FROM master_data_repository WHERE file_name = %s", (table_name,))
+    row = await cur.fetchone()
+    # created_at keeps the key unique when a dropped dataset is ingested again from version 1
+    return f"{row[0]}@{row[1].isoformat()}" if row else None
+
+_TOUCH_DATASET_SQL = """
+    UPDATE master_data_repository
+    SET last_queried_at = CURRENT_TIMESTAMP
+    WHERE file_name = %s
+      AND (last_queried_at IS NULL OR last_queried_at < CURRENT_TIMESTAMP - INTERVAL '1 minute')
+"""
+
+def touch_dataset(cur, table_name: str):
+    """Record that a dataset was queried (at most once a minute), for the garbage collector."""
+    cur.execute(_TOUCH_DATASET_SQL, (table_name,))
+
+async def atouch_dataset(cur, table_name: str):
+    """touch_dataset for a psycopg 3 async cursor."""
+    await cur.execute(_TOUCH_DATASET_SQL, (table_name,))
+
+
+# ---------- column_profiles helpers ----------
+# column_profiles holds the per-column statistics computed by ColumnProfiler at
+# ingest time, so query-time code can read cardinality, ranges and frequent
+# values without scanning the dataset.
+
+def ensure_column_profiles(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS column_profiles (
+            table_name VARCHAR(255),
+            column_name VARCHAR(255),
+            ordinal INTEGER,
+            data_type VARCHAR(64),
+            row_count BIGINT,
+            null_count BIGINT,
+            distinct_count BIGINT,
+            distinct_is_exact BOOLEAN,
+            min_value TEXT,
+            max_value TEXT,
+            top_values JSONB,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, column_name)
+        )
+    """)
+
+def save_column_profiles(cur, table_name: str, profiles: List[Dict[str, Any]]):
+    """Replace the stored profiles of `table_name`."""
+    cur.execute("DELETE FROM column_profiles WHERE table_name = %s", (table_name,))
+    execute_values(cur, """
+        INSERT INTO column_profiles (table_name, column_name, ordinal, data_type, row_count, null_count,
+                                     distinct_count, distinct_is_exact, min_value, max_value, top_values)
+        VALUES %s
+    """, [
+        (table_name, p["column_name"], p["ordinal"], p["data_type"], p["row_count"], p["null_count"],
+         p["distinct_count"], p["distinct_is_exact"], p["min_value"], p["max_value"], Json(p["top_values"]))
+        for p in profiles
+    ])
+
+_PROFILE_KEYS = ["column_name", "ordinal", "data_type", "row_count", "null_count", "distinct_count",
+                 "distinct_is_exact", "min_value", "max_value", "top_values"]
+_HAS_PROFILES_SQL = "SELECT to_regclass('public.column_profiles') IS NOT NULL"
+_LOAD_PROFILES_SQL = f"""
+    SELECT {", ".join(_PROFILE_KEYS)}
+    FROM column_profiles
+    WHERE table_name = %s
+    ORDER BY ordinal
+"""
+
+def load_column_profiles(cur, table_name: str) -> List[Dict[str, Any]]:
+    """Stored profiles of `table_name` in column order; empty if it was never profiled."""
+    cur.execute(_HAS_PROFILES_SQL)
+    if not cur.fetchone()[0]:
+        return []
+    cur.execute(_LOAD_PROFILES_SQL, (table_name,))
+    return [dict(zip(_PROFILE_KEYS, row)) for row in cur.fetchall()]
+
+async def aload_column_profiles(cur, table_name: str) -> List[Dict[str, Any]]:
+    """load_column_profiles for a psycopg 3 async (tuple-row) cursor."""
+    await cur.execute(_HAS_PROFILES_SQL)
+    if not (await cur.fetchone())[0]:
+        return []
+    await cur.execute(_LOAD_PROFILES_SQL, (table_name,))
+    return [dict(zip(_PROFILE_KEYS, row)) for row in await cur.fetchall()]
@@ -0,0 +1,103 @@
+from core.config import INGEST_CHUNK_ROWS
+from typing import BinaryIO, Dict, Iterator
+import pandas as pd
+
+# ---------- Parquet / Arrow IPC readers ----------
+# Columnar uploads carry their own schema, so column types are mapped from it
+# instead of being inferred, and record batches are streamed into the same
+# chunk pipeline as CSV. pyarrow is imported lazily so CSV-only deployments
+# do not need it.
+
+PARQUET_EXT = {".parquet"}
+ARROW_EXT = {".arrow", ".feather", ".ipc"}
+COLUMNAR_EXT = PARQUET_EXT | ARROW_EXT
+
+def _pyarrow():
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401  (registers pa.ipc)
+    import pyarrow.parquet  # noqa: F401  (registers pa.parquet)
+    return pa
+
+def arrow_sql_type(arrow_type) -> str:
+    """Map an Arrow type to the Postgres type ingest creates for it."""
+    pa = _pyarrow()
+    t = pa.types
+    if t.is_dictionary(arrow_type):
+        return arrow_sql_type(arrow_type.value_type)
+    if t.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if t.is_integer(arrow_type):
+        if arrow_type.bit_width <= 8 or (arrow_type.bit_width == 16 and t.is_signed_integer(arrow_type)):
+            return "SMALLINT"
+        if arrow_type.bit_width <= 32 and not (arrow_type.bit_width == 32 and t.is_unsigned_integer(arrow_type)):
+            return "INTEGER"
+        if t.is_uint64(arrow_type):
+            return "NUMERIC"  # exceeds BIGINT
+        return "BIGINT"
+    if t.is_decimal(arrow_type):
+        return "NUMERIC"
+    if t.is_floating(arrow_type):
+        return "DOUBLE PRECISION"
+    if t.is_date(arrow_type):
+        return "DATE"
+    if t.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    return "TEXT"
+
+def _to_pandas(data) -> pd.DataFrame:
+    """
+    Record batch / table to pandas with integer columns as nullable Int*/UInt*
+    dtypes; the default turns an integer column with nulls into float64,
+    which rounds values above 2^53.
+    """
+    pa = _pyarrow()
+    integer_dtypes = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(), pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+    }
+    return data.to_pandas(types_mapper=integer_dtypes.get)
+
+def _open_ipc(fileobj: BinaryIO):
+    """Arrow IPC comes in a random-access file format and a streaming format; accept both."""
+    pa = _pyarrow()
+    fileobj.seek(0)
+    try:
+        return pa.ipc.open_file(fileobj)
+    except pa.ArrowInvalid:
+        fileobj.seek(0)
+        return pa.ipc.open_stream(fileobj)
+
+def columnar_schema_types(fileobj: BinaryIO, ext: str) -> Dict[str, str]:
+    """{column name: SQL type} read from the file's own schema, without touching the data."""
+    pa = _pyarrow()
+    fileobj.seek(0)
+    if ext in PARQUET_EXT:
+        schema = pa.parquet.ParquetFile(fileobj).schema_arrow
+    else:
+        schema = _open_ipc(fileobj).schema
+    return {field.name: arrow_sql_type(field.type) for field in schema}
+
+def iter_columnar_chunks(fileobj: BinaryIO, ext: str) -> Iterator[pd.DataFrame]:
+    """Yield DataFrames of at most INGEST_CHUNK_ROWS rows, one record batch at a time."""
+    pa = _pyarrow()
+    fileobj.seek(0)
+    if ext in PARQUET_EXT:
+        batches = pa.parquet.ParquetFile(fileobj).iter_batches(batch_size=INGEST_CHUNK_ROWS)
+    else:
+        reader = _open_ipc(fileobj)
+        if isinstance(reader, pa.ipc.RecordBatchFileReader):
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            batches = iter(reader)
+
+    yielded = False
+    for batch in batches:
+        # IPC batches are sized by the writer; re-slice so chunks stay bounded
+        for offset in range(0, batch.num_rows, INGEST_CHUNK_ROWS):
+            yielded = True
+            yield _to_pandas(batch.slice(offset, INGEST_CHUNK_ROWS))
+    if not yielded:
+        # still create the (empty) table from the schema
+        fileobj.seek(0)
+        schema = pa.parquet.ParquetFile(fileobj).schema_arrow if ext in PARQUET_EXT else _open_ipc(fileobj).schema
+        yield _to_pandas(schema.empty_table())
@@ -1,5 +1,4 @@
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 import os
 
 load_dotenv()
@@ -11,25 +10,70 @@ PG_HOST = os.getenv("PG_HOST", "")
 PG_PORT = os.getenv("PG_PORT", "")
 PG_DB   = os.getenv("PG_DB", "")
 
-DATABASE_URL = f"postgresql://{PG_USER}:{PG_PASS}@{PG_HOST}:{PG_PORT}/{PG_DB}"
+# pooled connections (core/db_pool.py), sized per process
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))     # wait for a free async connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "60000"))    # applied on each checkout; 0 disables
 
-_engine = None
 
-def get_engine():
-    global _engine
-    if _engine is None:
-        _engine = create_engine(DATABASE_URL, pool_size=5, max_overflow=10)
-    return _engine
-
-def get_raw_psycopg_conn():
-    """Return a new psycopg2 connection (caller must close)."""
-    import psycopg2
-    return psycopg2.connect(host=PG_HOST, port=PG_PORT, user=PG_USER, password=PG_PASS, dbname=PG_DB)
-
-
-ALLOWED_EXT = {".csv", ".xlsx"}  # allowed extensions (xlsx included)
+ALLOWED_EXT = {".csv", ".csv.gz", ".csv.zst", ".xlsx", ".parquet", ".arrow", ".feather", ".ipc"}  # allowed extensions (compressed CSV, xlsx, Parquet and Arrow IPC included)
 TABLE_PREFIX = "Data_Set_"       # prefix required
 REQUEST_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT", "60"))
 MAX_QUERY_LENGTH = int(os.getenv("MAX_QUERY_LENGTH", "4000"))
-MAX_ROWS_SERVER = int(os.getenv("MAX_ROWS_RETURN", "5000"))
-ALLOWED_VIZ = {"bar", "line", "scatter", "table"}
\ No newline at end of file
+MAX_ROWS_SERVER = int(os.getenv("MAX_ROWS_RETURN", "5000"))                    # rows fetched per generated query
+MAX_RESULT_BYTES = int(os.getenv("MAX_RESULT_BYTES", str(16 * 1024 * 1024)))   # estimated result size per query; 0 is unlimited
+QUERY_FETCH_ROWS = int(os.getenv("QUERY_FETCH_ROWS", "1000"))                  # server-side cursor batch size
+QUERY_STATEMENT_TIMEOUT_MS = int(REQUEST_TIMEOUT_SECONDS * 1000)               # statement_timeout of each generated query
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "10000000"))                # EXPLAIN cost above which a query is rejected; 0 disables
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))   # how often /analyze checks for a gone client
+RESULT_SUMMARY_MAX_TOKENS = int(os.getenv("RESULT_SUMMARY_MAX_TOKENS", "1500"))  # query results as shown to LLM prompts
+RESULT_SUMMARY_HEAD_ROWS = int(os.getenv("RESULT_SUMMARY_HEAD_ROWS", "20"))
+RESULT_SUMMARY_TAIL_ROWS = int(os.getenv("RESULT_SUMMARY_TAIL_ROWS", "5"))
+NOUN_TOP_K = int(os.getenv("NOUN_TOP_K", "20"))  # column values matching the question passed to SQL generation
+ALLOWED_VIZ = {"bar", "line", "scatter", "table"}
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))  # rows per streamed COPY chunk
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))  # ingest job worker processes
+XLSX_SHEET_WORKERS = int(os.getenv("XLSX_SHEET_WORKERS", "4"))  # processes parsing sheets of one workbook
+UPLOAD_READ_CHUNK_BYTES = int(os.getenv("UPLOAD_READ_CHUNK_BYTES", str(1024 * 1024)))
+INGEST_JOB_HEARTBEAT_SECONDS = float(os.getenv("INGEST_JOB_HEARTBEAT_SECONDS", "60"))  # how often in-flight jobs touch updated_at
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "600"))  # unfinished job with no heartbeat for this long is dead
+
+# post-ingest physical optimization (ANALYZE + indexes)
+INGEST_OPTIMIZE = os.getenv("INGEST_OPTIMIZE", "true").lower() == "true"
+INDEX_MAX_DISTINCT = int(os.getenv("INDEX_MAX_DISTINCT", "1000"))  # TEXT columns up to this cardinality get a B-tree
+INGEST_TRIGRAM_INDEXES = os.getenv("INGEST_TRIGRAM_INDEXES", "false").lower() == "true"  # needs pg_trgm
+NOUN_TRIGRAM_INDEXES = os.getenv("NOUN_TRIGRAM_INDEXES", "false").lower() == "true"  # trigram index on TEXT columns the profile does not list in full; needs pg_trgm
+
+# dictionary encoding: low-cardinality TEXT columns stored as integer codes behind a view
+INGEST_DICTIONARY_ENCODING = os.getenv("INGEST_DICTIONARY_ENCODING", "false").lower() == "true"
+DICTIONARY_MAX_DISTINCT = int(os.getenv("DICTIONARY_MAX_DISTINCT", "1000"))  # distinct values for a column to be encoded
+
+# time partitioning: large uploads with a TIMESTAMP/DATE column become RANGE-partitioned tables
+INGEST_PARTITIONING = os.getenv("INGEST_PARTITIONING", "false").lower() == "true"
+PARTITION_MIN_BYTES = int(os.getenv("PARTITION_MIN_BYTES", str(256 * 1024 * 1024)))  # upload size that triggers it
+PARTITION_GRANULARITY = os.getenv("PARTITION_GRANULARITY", "month").lower()  # month | year
+
+# ingest-time column profiles (column_profiles catalog table)
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "50"))                    # most frequent values kept per column
+PROFILE_TRACK_VALUES = int(os.getenv("PROFILE_TRACK_VALUES", "10000"))   # distinct values counted before estimating
+
+# dataset garbage collection (services/dataset_gc.py)
+DATASET_GC_ENABLED = os.getenv("DATASET_GC_ENABLED", "true").lower() == "true"
+DATASET_RETENTION_HOURS = float(os.getenv("DATASET_RETENTION_HOURS", "6"))    # idle time before a dataset expires; 0 keeps forever
+DATASET_SIZE_BUDGET_BYTES = int(os.getenv("DATASET_SIZE_BUDGET_BYTES", "0"))  # total size of all datasets; 0 is unlimited
+DATASET_GC_INTERVAL_SECONDS = int(os.getenv("DATASET_GC_INTERVAL_SECONDS", "600"))
+
+# query-time caches (core/cache.py)
+SCHEMA_CACHE_ENTRIES = int(os.getenv("SCHEMA_CACHE_ENTRIES", "512"))
+SCHEMA_CACHE_TTL_SECONDS = float(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "3600"))  # also bounds staleness of unregistered tables
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "1024"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # estimated size of cached rows
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# LLM response cache (workflow/LLMconfig.py); responses are deterministic at temperature 0
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1024"))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "50000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")  # "" keeps the cache in memory only
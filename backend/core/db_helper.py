@@ -1,6 +1,8 @@
 from psycopg2 import sql
-from pathlib import Path
-from typing import List
+from typing import List, Dict, Tuple
+from core.optimizer import index_name
+import io
+import pandas as pd
 
 # ---------- DB helpers ----------
 def create_table_drop_if_exists(conn, table_name: str, columns: List[str]):
@@ -22,18 +24,120 @@ def create_table_drop_if_exists(conn, table_name: str, columns: List[str]):
     cur.execute(create_stmt)
     conn.commit()
 
-def copy_csv_into_table(conn, csv_path: Path, table_name: str, columns: List[str]) -> int:
+# backslash must be escaped first so the other escapes are not doubled
+_COPY_TEXT_ESCAPES = [("\\", "\\\\"), ("\t", "\\t"), ("\n", "\\n"), ("\r", "\\r")]
+
+def serialize_chunk_for_copy(df: pd.DataFrame) -> io.StringIO:
+    """
+    Serialize a DataFrame into Postgres COPY text format (tab separated, \\N for NULL).
+    Work is done a column at a time with vectorized pandas string ops rather
+    than a Python loop over rows.
+    """
+    fields = []
+    for i in range(df.shape[1]):
+        sr = df.iloc[:, i]
+        nulls = sr.isna()
+        text = sr.astype(str)
+        # anything that may hold text (object, string, categorical, ...) is escaped
+        if not (pd.api.types.is_numeric_dtype(sr) or pd.api.types.is_bool_dtype(sr)
+                or pd.api.types.is_datetime64_any_dtype(sr)):
+            for raw, escaped in _COPY_TEXT_ESCAPES:
+                text = text.str.replace(raw, escaped, regex=False)
+        fields.append(text.mask(nulls, "\\N"))
+
+    buf = io.StringIO()
+    if len(df):
+        lines = fields[0].str.cat(fields[1:], sep="\t") if len(fields) > 1 else fields[0]
+        buf.write(lines.str.cat(sep="\n"))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def copy_chunk_into_table(conn, df: pd.DataFrame, table_name: str, columns: List[str]) -> int:
     """
-    Use COPY to load CSV into the named table. Returns row count.
-    Assumes csv header matches columns exactly.
+    COPY one DataFrame chunk into the named table straight from an in-memory
+    buffer. Does not commit; returns the row count reported by COPY.
     """
+    if df.empty:
+        return 0
+    buf = serialize_chunk_for_copy(df)
     cur = conn.cursor()
     cols_ident = sql.SQL(", ").join(map(sql.Identifier, columns))
-    copy_stmt = sql.SQL("COPY {} ({}) FROM STDIN WITH CSV HEADER").format(sql.Identifier(table_name), cols_ident)
-    with open(csv_path, "r", encoding="utf-8") as f:
-        cur.copy_expert(copy_stmt, f)
-    conn.commit()
-    # get count
-    cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table_name)))
-    cnt = cur.fetchone()[0]
-    return cnt
\ No newline at end of file
+    copy_stmt = sql.SQL("COPY {} ({}) FROM STDIN").format(sql.Identifier(table_name), cols_ident)
+    cur.copy_expert(copy_stmt, buf)
+    return cur.rowcount
+
+
+def get_table_columns(conn, table_name: str) -> Dict[str, str]:
+    """Ordered {column: information_schema data_type} for a public table (empty if missing)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        return {col: dtype for col, dtype in cur.fetchall()}
+
+def create_staging_table(conn, table_name: str) -> str:
+    """Create an empty temp table shaped like `table_name`, dropped at commit. Returns its name."""
+    staging = index_name(table_name, "", "staging")  # capped at 63 bytes like every derived name
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+            sql.Identifier(staging), sql.Identifier(table_name)))
+    return staging
+
+def merge_staging_into_table(conn, staging: str, table_name: str, columns: List[str], key_column: str) -> Tuple[int, int]:
+    """
+    Upsert staged rows into `table_name` by `key_column`: rows whose key already
+    exists are updated, the rest inserted. When a key repeats within the
+    staged rows the last one wins; rows with a NULL key are always inserted.
+    Does not commit; returns (inserted, updated).
+    """
+    key = sql.Identifier(key_column)
+    target = sql.Identifier(table_name)
+    deduped = sql.Identifier(index_name(staging, "", "dedup"))
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    with conn.cursor() as cur:
+        # an index on the key keeps the update/anti-join below from scanning the target per row
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ({})").format(
+            sql.Identifier(index_name(table_name, key_column, "key_idx")), target, key))
+        cur.execute(sql.SQL("""
+            CREATE TEMP TABLE {deduped} ON COMMIT DROP AS
+            SELECT DISTINCT ON ({key}) * FROM {staging}
+            WHERE {key} IS NOT NULL
+            ORDER BY {key}, ctid DESC
+        """).format(deduped=deduped, key=key, staging=sql.Identifier(staging)))
+
+        assignments = sql.SQL(", ").join(
+            sql.SQL("{} = s.{}").format(sql.Identifier(c), sql.Identifier(c)) for c in columns if c != key_column)
+        updated = 0
+        if columns != [key_column]:
+            cur.execute(sql.SQL("UPDATE {target} t SET {assignments} FROM {deduped} s WHERE t.{key} = s.{key}").format(
+                target=target, assignments=assignments, deduped=deduped, key=key))
+            updated = cur.rowcount
+
+        cur.execute(sql.SQL("""
+            INSERT INTO {target} ({cols})
+            SELECT {cols} FROM {deduped} s
+            WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.{key} = s.{key})
+        """).format(target=target, cols=cols, deduped=deduped, key=key))
+        inserted = cur.rowcount
+        cur.execute(sql.SQL("INSERT INTO {target} ({cols}) SELECT {cols} FROM {staging} WHERE {key} IS NULL").format(
+            target=target, cols=cols, staging=sql.Identifier(staging), key=key))
+        inserted += cur.rowcount
+    return inserted, updated
+
+def alter_column_types(conn, table_names: List[str], changes: Dict[str, str]):
+    """
+    Widen column types in place (one table rewrite per table), converting the
+    rows already loaded with a cast. Does not commit.
+    """
+    with conn.cursor() as cur:
+        for table_name in table_names:
+            clauses = [
+                sql.SQL("ALTER COLUMN {col} TYPE {typ} USING {col}::{typ}").format(
+                    col=sql.Identifier(col), typ=sql.SQL(col_type))
+                for col, col_type in changes.items()
+            ]
+            cur.execute(sql.SQL("ALTER TABLE {} ").format(sql.Identifier(table_name)) + sql.SQL(", ").join(clauses))
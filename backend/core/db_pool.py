@@ -0,0 +1,124 @@
+from core.config import (PG_HOST, PG_PORT, PG_USER, PG_PASS, PG_DB, DB_POOL_MIN, DB_POOL_MAX,
+                         DB_POOL_TIMEOUT_SECONDS, DB_STATEMENT_TIMEOUT_MS)
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Iterator, Optional
+import asyncio
+import threading
+
+# ---------- Shared connection pools ----------
+# Every database access goes through one of two process-wide pools: psycopg2
+# for blocking callers (ingest, jobs, GC) and psycopg 3 AsyncConnectionPool
+# for the async analyze path. Both are bounded by DB_POOL_MAX, hand out only
+# connections that answer a health check, and apply a statement_timeout on
+# every checkout (DB_STATEMENT_TIMEOUT_MS unless the caller overrides it;
+# ingest passes 0 because bulk COPY and index builds are long by design).
+# Ingest worker processes each get their own pools on first use.
+# ThreadedConnectionPool raises PoolError at once when every connection is
+# out, so blocking checkouts first take a slot of a semaphore sized to the
+# pool and wait up to DB_POOL_TIMEOUT_SECONDS for one, like the async pool.
+
+_pool = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+_pool_lock = threading.Lock()
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+def get_pg_pool():
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                _pool = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, host=PG_HOST, port=PG_PORT,
+                                               user=PG_USER, password=PG_PASS, dbname=PG_DB)
+    return _pool
+
+def _checkout(pool, statement_timeout_ms: int):
+    """
+    Get a connection and set its statement_timeout; the SET doubles as the
+    health check, so a connection the server dropped is discarded and replaced.
+    """
+    import psycopg2
+    for attempt in range(2):
+        conn = pool.getconn()
+        try:
+            conn.autocommit = True  # SET outside a transaction persists for the session
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (statement_timeout_ms,))
+            return conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            pool.putconn(conn, close=True)
+            if attempt:
+                raise
+
+@contextmanager
+def pooled_connection(statement_timeout_ms: Optional[int] = None, autocommit: bool = False) -> Iterator:
+    """
+    Check a healthy connection out of the pool; whatever the caller did not
+    commit is rolled back when it is returned. Session settings the caller
+    changes itself (other than statement_timeout) must be reset by the caller.
+    """
+    from psycopg2.pool import PoolError
+    pool = get_pg_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        raise PoolError(f"no database connection became free within {DB_POOL_TIMEOUT_SECONDS}s")
+    try:
+        timeout = DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+        conn = _checkout(pool, timeout)
+        conn.autocommit = autocommit
+        try:
+            yield conn
+        finally:
+            if not conn.closed:
+                conn.rollback()  # discard anything the caller left uncommitted
+                conn.autocommit = False
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        slots.release()
+
+def close_pg_pool():
+    global _pool, _pool_slots
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+        _pool_slots = None
+
+async def get_async_pool():
+    """The psycopg 3 AsyncConnectionPool, opened on first use."""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                from psycopg.conninfo import make_conninfo
+                from psycopg_pool import AsyncConnectionPool
+                conninfo = make_conninfo(host=PG_HOST, port=PG_PORT, user=PG_USER, password=PG_PASS, dbname=PG_DB)
+                pool = AsyncConnectionPool(
+                    conninfo, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT_SECONDS,
+                    check=AsyncConnectionPool.check_connection,  # health check on every checkout
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+@asynccontextmanager
+async def async_pooled_connection(statement_timeout_ms: Optional[int] = None) -> AsyncIterator:
+    """
+    Async counterpart of pooled_connection. The checkout is one transaction:
+    committed when the block exits normally, rolled back on error.
+    """
+    from psycopg import sql
+    pool = await get_async_pool()
+    timeout = DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    async with pool.connection() as conn:
+        # SET LOCAL lasts exactly as long as this checkout's transaction
+        await conn.execute(sql.SQL("SET LOCAL statement_timeout = {}").format(sql.Literal(timeout)))
+        yield conn
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
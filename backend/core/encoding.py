@@ -0,0 +1,145 @@
+from core.config import DICTIONARY_MAX_DISTINCT
+from core.optimizer import index_name
+from psycopg2 import sql
+from typing import Dict, List, Optional
+
+# ---------- Dictionary encoding of low-cardinality text columns ----------
+# An encoded dataset is stored as:
+#   <table>__base          the rows, encoded columns holding INTEGER codes
+#   <table>_<col>_dim      (code INTEGER PRIMARY KEY, value TEXT UNIQUE) per encoded column
+#   <table>                a view joining them back into the original shape
+# The view LEFT JOINs each dimension on its primary key, so Postgres removes
+# the joins of dimensions a query does not reference, and generated SQL keeps
+# querying <table> unchanged.
+
+def base_table_name(table_name: str) -> str:
+    return index_name(table_name, "", "base")
+
+def dim_table_name(table_name: str, column: str) -> str:
+    return index_name(table_name, column, "dim")
+
+def encoding_candidates(types_map: Dict[str, str], distinct_counts: Dict[str, int],
+                        exact: Dict[str, bool], row_count: int) -> List[str]:
+    """TEXT columns whose exact distinct count is small and repeated across the rows."""
+    return [
+        col for col, col_type in types_map.items()
+        if col_type == "TEXT" and exact.get(col)
+        and 0 < distinct_counts.get(col, 0) <= DICTIONARY_MAX_DISTINCT
+        and distinct_counts[col] < row_count
+    ]
+
+def encoded_columns(conn, table_name: str) -> Optional[Dict[str, str]]:
+    """{column: dimension table} of an encoded dataset, or None if `table_name` is a plain table."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name FROM information_schema.view_table_usage
+            WHERE view_schema = 'public' AND view_name = %s
+        """, (table_name,))
+        backing = {row[0] for row in cur.fetchall()}
+        if base_table_name(table_name) not in backing:
+            return None
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        columns = [row[0] for row in cur.fetchall()]
+    return {col: dim_table_name(table_name, col) for col in columns if dim_table_name(table_name, col) in backing}
+
+def drop_dataset(cur, table_name: str):
+    """Drop a dataset whether it is a plain table or an encoded view with its backing tables."""
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(format('%%I', %s))", (table_name,))
+    row = cur.fetchone()
+    if row is None:
+        return
+    if row[0] != "v":
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+        return
+    cur.execute("""
+        SELECT DISTINCT table_name FROM information_schema.view_table_usage
+        WHERE view_schema = 'public' AND view_name = %s
+    """, (table_name,))
+    backing = [r[0] for r in cur.fetchall()]
+    cur.execute(sql.SQL("DROP VIEW IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+    for name in backing:
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(name)))
+
+def _create_decoding_view(cur, table_name: str, columns: List[str], dims: Dict[str, str]):
+    select = []
+    joins = []
+    for i, col in enumerate(columns):
+        if col in dims:
+            alias = sql.Identifier(f"d{i}")
+            select.append(sql.SQL("{}.value AS {}").format(alias, sql.Identifier(col)))
+            joins.append(sql.SQL("LEFT JOIN {dim} {alias} ON {alias}.code = b.{col}").format(
+                dim=sql.Identifier(dims[col]), alias=alias, col=sql.Identifier(col)))
+        else:
+            select.append(sql.SQL("b.{}").format(sql.Identifier(col)))
+    cur.execute(sql.SQL("CREATE VIEW {view} AS SELECT {select} FROM {base} b {joins}").format(
+        view=sql.Identifier(table_name),
+        select=sql.SQL(", ").join(select),
+        base=sql.Identifier(base_table_name(table_name)),
+        joins=sql.SQL(" ").join(joins),
+    ))
+
+def _encoded_select(source: str, columns: List[str], dims: Dict[str, str]) -> sql.Composed:
+    """SELECT of `source`'s rows with the `dims` columns replaced by their codes."""
+    select = []
+    joins = []
+    for i, col in enumerate(columns):
+        if col in dims:
+            alias = sql.Identifier(f"d{i}")
+            select.append(sql.SQL("{}.code").format(alias))
+            joins.append(sql.SQL("LEFT JOIN {dim} {alias} ON {alias}.value = s.{col}").format(
+                dim=sql.Identifier(dims[col]), alias=alias, col=sql.Identifier(col)))
+        else:
+            select.append(sql.SQL("s.{}").format(sql.Identifier(col)))
+    return sql.SQL("SELECT {select} FROM {source} s {joins}").format(
+        select=sql.SQL(", ").join(select), source=sql.Identifier(source), joins=sql.SQL(" ").join(joins))
+
+def _add_dictionary_values(cur, dim: str, source: str, column: str):
+    """Give every value of `source.column` not yet in `dim` the next free code."""
+    cur.execute(sql.SQL("""
+        INSERT INTO {dim} (code, value)
+        SELECT (SELECT COALESCE(MAX(code), 0) FROM {dim}) + row_number() OVER (ORDER BY v), v
+        FROM (SELECT DISTINCT {col} AS v FROM {source} WHERE {col} IS NOT NULL
+              EXCEPT SELECT value FROM {dim}) n
+    """).format(dim=sql.Identifier(dim), col=sql.Identifier(column), source=sql.Identifier(source)))
+
+def encode_table(conn, table_name: str, columns: List[str], encode: List[str]) -> Dict[str, str]:
+    """
+    Rewrite the freshly loaded `table_name` into an encoded dataset: build a
+    dimension table per `encode` column, copy the rows into the base table
+    with codes in place of the strings, then replace the table with the
+    decoding view. Commits; returns {column: dimension table}.
+    """
+    base = base_table_name(table_name)
+    dims = {col: dim_table_name(table_name, col) for col in encode}
+    with conn.cursor() as cur:
+        for col, dim in dims.items():
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(dim)))
+            cur.execute(sql.SQL("CREATE TABLE {} (code INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)").format(
+                sql.Identifier(dim)))
+            _add_dictionary_values(cur, dim, table_name, col)
+        cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(base)))
+        cur.execute(sql.SQL("CREATE TABLE {} AS ").format(sql.Identifier(base))
+                    + _encoded_select(table_name, columns, dims))
+        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(table_name)))
+        _create_decoding_view(cur, table_name, columns, dims)
+        for dim in dims.values():
+            cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(dim)))
+    conn.commit()
+    return dims
+
+def append_encoded(conn, staging: str, table_name: str, columns: List[str], dims: Dict[str, str]) -> int:
+    """
+    Insert the staged (decoded) rows into an encoded dataset, adding new
+    dictionary values first. Does not commit; returns the rows inserted.
+    """
+    with conn.cursor() as cur:
+        for col, dim in dims.items():
+            _add_dictionary_values(cur, dim, staging, col)
+        cur.execute(sql.SQL("INSERT INTO {} ({}) ").format(
+            sql.Identifier(base_table_name(table_name)), sql.SQL(", ").join(map(sql.Identifier, columns)))
+            + _encoded_select(staging, columns, dims))
+        return cur.rowcount
@@ -0,0 +1,55 @@
+from core.config import INGEST_CHUNK_ROWS
+from typing import BinaryIO, Iterator, List, Optional, Union
+import pandas as pd
+
+# ---------- Read-only xlsx streaming ----------
+# openpyxl's read-only mode parses worksheets row by row instead of building
+# the full workbook object model that pd.read_excel loads.
+
+def list_sheets(source: Union[str, BinaryIO]) -> List[str]:
+    """Worksheet names of a workbook (path or binary file), in workbook order; chart sheets are left out."""
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True)
+    try:
+        return [ws.title for ws in wb.worksheets]
+    finally:
+        wb.close()
+
+def _to_frame(rows: List[tuple], header: List[str]) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=header, dtype=object)
+    # match the CSV path: every non-null cell as text
+    return df.where(df.isna(), df.astype(str))
+
+def iter_sheet_chunks(source: Union[str, BinaryIO], sheet_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream one worksheet (the first if `sheet_name` is None) as DataFrames of
+    at most INGEST_CHUNK_ROWS rows. The first row is the header; blank rows
+    are skipped.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = list(header)
+        width = len(header)
+
+        batch = []
+        yielded = False
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            batch.append(row)
+            if len(batch) >= INGEST_CHUNK_ROWS:
+                yield _to_frame(batch, header)
+                yielded = True
+                batch = []
+        if batch or not yielded:
+            # a header-only sheet still yields an (empty) frame so its table is created
+            yield _to_frame(batch, header)
+    finally:
+        wb.close()
@@ -0,0 +1,97 @@
+from core.config import INDEX_MAX_DISTINCT, INGEST_TRIGRAM_INDEXES, NOUN_TRIGRAM_INDEXES, PROFILE_TOP_K
+from psycopg2 import sql
+from typing import Dict, Any, List, Optional
+import hashlib
+import time
+
+# ---------- Post-ingest physical optimization ----------
+
+def index_name(table_name: str, column: str, suffix: str) -> str:
+    """Deterministic index name that stays within Postgres' 63-byte identifier limit."""
+    name = f"{table_name}_{column}_{suffix}"
+    if len(name) <= 63:
+        return name
+    digest = hashlib.md5(name.encode("utf-8")).hexdigest()[:8]
+    return f"{name[:63 - len(suffix) - 10]}_{digest}_{suffix}"
+
+def column_distinct_estimates(conn, table_name: str, row_count: int) -> Dict[str, float]:
+    """Read ANALYZE's n_distinct per column, resolving negative (fractional) estimates."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT attname, n_distinct
+            FROM pg_stats
+            WHERE schemaname = 'public' AND tablename = %s
+        """, (table_name,))
+        rows = cur.fetchall()
+    return {col: (-n * row_count if n < 0 else n) for col, n in rows}
+
+def _create_index(conn, table_name: str, column: str, suffix: str, method: str = "btree", opclass: str = "") -> str:
+    name = index_name(table_name, column, suffix)
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING {} ({} {})").format(
+            sql.Identifier(name),
+            sql.Identifier(table_name),
+            sql.SQL(method),
+            sql.Identifier(column),
+            sql.SQL(opclass),
+        ))
+    conn.commit()
+    return name
+
+def _enable_trigram(conn) -> bool:
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[warn] pg_trgm unavailable, skipping trigram indexes: {e}")
+        return False
+
+def optimize_table(conn, table_name: str, types_map: Dict[str, str], row_count: int,
+                   distinct_counts: Optional[Dict[str, int]] = None,
+                   code_columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Run ANALYZE on a freshly loaded table, then build B-tree indexes on
+    DATE/TIMESTAMP columns and low-cardinality TEXT columns, plus pg_trgm GIN
+    indexes on TEXT columns when INGEST_TRIGRAM_INDEXES is set (with
+    NOUN_TRIGRAM_INDEXES, on those with more than PROFILE_TOP_K distinct
+    values, for question-driven noun lookups).
+    Cardinality comes from `distinct_counts` (the ingest profile) when given,
+    otherwise from ANALYZE's pg_stats estimates.
+    `code_columns` are dictionary-encoded columns of an encoded base table:
+    they hold integer codes, get a B-tree and never a trigram index.
+    Returns a report of what was built and how long each step took.
+    """
+    code_columns = code_columns or []
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"indexes": [], "trigram_indexes": []}
+
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
+    conn.commit()
+    report["analyze_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    index_started = time.perf_counter()
+    distinct = distinct_counts or column_distinct_estimates(conn, table_name, row_count)
+    btree_cols: List[str] = []
+    for col, col_type in types_map.items():
+        if col in code_columns or col_type in ("DATE", "TIMESTAMP"):
+            btree_cols.append(col)
+        elif col_type == "TEXT" and 0 < distinct.get(col, INDEX_MAX_DISTINCT + 1) <= INDEX_MAX_DISTINCT:
+            btree_cols.append(col)
+    for col in btree_cols:
+        report["indexes"].append(_create_index(conn, table_name, col, "idx"))
+
+    text_cols = [col for col, col_type in types_map.items() if col_type == "TEXT" and col not in code_columns]
+    if not INGEST_TRIGRAM_INDEXES:
+        text_cols = [col for col in text_cols
+                     if NOUN_TRIGRAM_INDEXES and distinct.get(col, PROFILE_TOP_K + 1) > PROFILE_TOP_K]
+    if text_cols and _enable_trigram(conn):
+        for col in text_cols:
+            report["trigram_indexes"].append(_create_index(conn, table_name, col, "trgm", "gin", "gin_trgm_ops"))
+    report["index_ms"] = round((time.perf_counter() - index_started) * 1000, 1)
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
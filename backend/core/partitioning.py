@@ -0,0 +1,91 @@
+from core.config import PARTITION_GRANULARITY
+from core.optimizer import index_name
+from psycopg2 import sql
+from typing import Dict, Optional, Set, Tuple
+import re
+import pandas as pd
+
+# ---------- Time partitioning of large datasets ----------
+# A large upload with a TIMESTAMP/DATE column is created as a table
+# PARTITION BY RANGE on that column with one partition per month (or year),
+# named <table>_<YYYY_MM|YYYY>_part, plus <table>_default_part for NULLs.
+# Partitions are created just before the COPY of the chunk that needs them,
+# so the parent routes every row and queries filtering on the column are pruned.
+
+def choose_partition_column(types_map: Dict[str, str], first_chunk: pd.DataFrame) -> Optional[str]:
+    """The TIMESTAMP (else DATE) column with the fewest NULLs in the leading chunk, if any."""
+    for wanted in ("TIMESTAMP", "DATE"):
+        candidates = [col for col, col_type in types_map.items() if col_type == wanted]
+        if candidates:
+            return min(candidates, key=lambda col: first_chunk[col].isna().sum())
+    return None
+
+def partition_name(table_name: str, label: str) -> str:
+    return index_name(table_name, label, "part")
+
+def create_default_partition(conn, table_name: str):
+    """Catch-all partition; only NULL partition keys end up here since ranges are created ahead of COPY."""
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+            sql.Identifier(partition_name(table_name, "default")),
+            sql.Identifier(table_name)))
+
+def _period(start: str, granularity: str) -> Tuple[str, str, str]:
+    """(label, lower bound, upper bound) of the period starting at 'YYYY-MM' / 'YYYY'."""
+    year = int(start[:4])
+    if granularity == "year":
+        return f"{year}", f"{year}-01-01", f"{year + 1}-01-01"
+    month = int(start[5:7])
+    nxt_year, nxt_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year}_{month:02d}", f"{year}-{month:02d}-01", f"{nxt_year}-{nxt_month:02d}-01"
+
+def ensure_partitions(conn, table_name: str, values: pd.Series, created: Set[str], granularity: str):
+    """
+    Create the partitions the normalized 'YYYY-MM-DD[ HH:MM:SS]' `values` of
+    one chunk fall into, skipping periods already in `created` (updated in
+    place). Does not commit.
+    """
+    width = 4 if granularity == "year" else 7
+    periods = set(values.dropna().str[:width].unique()) - created
+    if not periods:
+        return
+    with conn.cursor() as cur:
+        for start in sorted(periods):
+            label, lower, upper = _period(start, granularity)
+            cur.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+                sql.Identifier(partition_name(table_name, label)), sql.Identifier(table_name),
+                sql.Literal(lower), sql.Literal(upper)))
+    created.update(periods)
+
+def partitioning_of(conn, table_name: str) -> Optional[Tuple[str, str, Set[str]]]:
+    """
+    (partition column, granularity, periods already created) of a
+    range-partitioned dataset, or None for a plain table or view.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT a.attname
+            FROM pg_partitioned_table p
+            JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+            WHERE p.partrelid = to_regclass(format('%%I', %s))
+        """, (table_name,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        cur.execute("""
+            SELECT pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(format('%%I', %s))
+        """, (table_name,))
+        bounds = [b for (b,) in cur.fetchall()]
+
+    granularity = PARTITION_GRANULARITY
+    periods: Set[str] = set()
+    for bound in bounds:
+        m = re.search(r"FROM \('(\d{4})-(\d{2})-\d{2}.*?TO \('(\d{4})-(\d{2})", bound)
+        if not m:
+            continue  # DEFAULT
+        y1, m1, y2, m2 = map(int, m.groups())
+        granularity = "year" if (y2 - y1) * 12 + (m2 - m1) == 12 else "month"
+        periods.add(f"{y1}" if granularity == "year" else f"{y1}-{m1:02d}")
+    return row[0], granularity, periods
@@ -0,0 +1,124 @@
+from core.config import PROFILE_TOP_K, PROFILE_TRACK_VALUES
+from core.utility import INTEGER_TYPES
+from typing import List, Dict, Any
+import pandas as pd
+
+# ---------- Ingest-time column profiling ----------
+
+def _from_text(value: str, col_type: str) -> Any:
+    """Parse a stored top value back into the form normalize_chunk produces."""
+    if col_type == "DOUBLE PRECISION":
+        return float(value)
+    if col_type in INTEGER_TYPES:
+        return int(value)
+    return value
+
+def _range_from_text(value: str, col_type: str) -> Any:
+    """Parse a stored min/max; NUMERIC ranges are tracked as numbers, its values as text."""
+    if col_type == "NUMERIC":
+        return float(value)
+    return _from_text(value, col_type)
+
+class ColumnProfiler:
+    """
+    Accumulates per-column statistics (row/null counts, min/max, value
+    frequencies) over the normalized chunks of an ingest, one vectorized
+    pass per chunk. Once a column has more than `track_limit` distinct
+    values only the most frequent are kept, and its distinct count becomes
+    a lower bound.
+    """
+
+    def __init__(self, columns: List[str], types_map: Dict[str, str],
+                 top_k: int = PROFILE_TOP_K, track_limit: int = PROFILE_TRACK_VALUES):
+        self.columns = columns
+        self.types_map = types_map
+        self.top_k = top_k
+        self.track_limit = track_limit
+        self.row_count = 0
+        self.null_counts = {c: 0 for c in columns}
+        self.mins: Dict[str, Any] = {}
+        self.maxs: Dict[str, Any] = {}
+        self.value_counts = {c: pd.Series(dtype="int64") for c in columns}
+        self.truncated = {c: False for c in columns}
+        self.distinct_floor = {c: 0 for c in columns}
+
+    @classmethod
+    def resume(cls, profiles: List[Dict[str, Any]], types_map: Dict[str, str]) -> "ColumnProfiler":
+        """
+        Rebuild a profiler from stored catalog profiles so an append can update
+        them incrementally. Only the stored top-k frequencies survive, so
+        distinct counts of previously truncated columns stay lower bounds.
+        """
+        columns = [p["column_name"] for p in profiles]
+        profiler = cls(columns, types_map)
+        for p in profiles:
+            col = p["column_name"]
+            col_type = types_map.get(col, "TEXT")
+            profiler.row_count = int(p["row_count"] or 0)
+            profiler.null_counts[col] = int(p["null_count"] or 0)
+            if p["min_value"] is not None:
+                profiler.mins[col] = _range_from_text(p["min_value"], col_type)
+                profiler.maxs[col] = _range_from_text(p["max_value"], col_type)
+            top = p["top_values"] or []
+            if top:
+                index = [_from_text(v, col_type) for v, _ in top]
+                profiler.value_counts[col] = pd.Series([c for _, c in top], index=index, dtype="int64")
+            if p["distinct_count"] > len(top) or not p["distinct_is_exact"]:
+                profiler.truncated[col] = True
+                profiler.distinct_floor[col] = int(p["distinct_count"])
+        return profiler
+
+    def update(self, df: pd.DataFrame):
+        self.row_count += len(df)
+        for col in self.columns:
+            sr = df[col]
+            non_null = sr.dropna()
+            self.null_counts[col] += len(sr) - len(non_null)
+            if non_null.empty:
+                continue
+
+            # NUMERIC cells are exact decimal text; compare them as numbers
+            ranged = pd.to_numeric(non_null) if self.types_map.get(col) == "NUMERIC" else non_null
+            lo, hi = ranged.min(), ranged.max()
+            self.mins[col] = lo if col not in self.mins else min(self.mins[col], lo)
+            self.maxs[col] = hi if col not in self.maxs else max(self.maxs[col], hi)
+
+            counts = self.value_counts[col].add(non_null.value_counts(), fill_value=0)
+            if len(counts) > self.track_limit:
+                counts = counts.nlargest(self.track_limit)
+                self.truncated[col] = True
+            self.value_counts[col] = counts
+
+    def retype(self, col: str, sql_type: str):
+        """Carry a column's accumulated stats over after ingest widened its type."""
+        self.types_map[col] = sql_type
+        if sql_type in ("TEXT", "NUMERIC", "TIMESTAMP"):
+            # their normalized values are text: re-key the frequencies the same way
+            counts = self.value_counts[col]
+            self.value_counts[col] = counts.groupby(counts.index.astype(str)).sum()
+        if sql_type in ("TEXT", "TIMESTAMP") and col in self.mins:
+            self.mins[col], self.maxs[col] = str(self.mins[col]), str(self.maxs[col])
+
+    def profiles(self) -> List[Dict[str, Any]]:
+        """One catalog record per column, in table column order."""
+        out = []
+        for ordinal, col in enumerate(self.columns, start=1):
+            counts = self.value_counts[col]
+            top = counts.nlargest(self.top_k)
+            out.append({
+                "column_name": col,
+                "ordinal": ordinal,
+                "data_type": self.types_map.get(col, "TEXT"),
+                "row_count": self.row_count,
+                "null_count": int(self.null_counts[col]),
+                "distinct_count": max(len(counts), self.distinct_floor[col]),
+                "distinct_is_exact": not self.truncated[col],
+                "min_value": str(self.mins[col]) if col in self.mins else None,
+                "max_value": str(self.maxs[col]) if col in self.maxs else None,
+                "top_values": [[str(v), int(c)] for v, c in top.items()],
+            })
+        return out
+
+    def distinct_counts(self) -> Dict[str, int]:
+        """Distinct counts per column; lower bounds for columns that were truncated."""
+        return {col: max(len(counts), self.distinct_floor[col]) for col, counts in self.value_counts.items()}
@@ -1,25 +1,57 @@
 from core.config import TABLE_PREFIX
+from core.encoding import drop_dataset
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 import re
 import pandas as pd
 import psycopg2
 from psycopg2 import sql
 
+COMPRESSION_SUFFIXES = {".gz", ".zst"}
+
 # ---------- Utility functions ----------
+def file_extension(filename: str) -> str:
+    """
+    Lower-cased extension of a filename, keeping the inner extension of
+    compressed files: "sales.CSV.gz" -> ".csv.gz", "sales.xlsx" -> ".xlsx".
+    """
+    suffixes = [s.lower() for s in Path(filename).suffixes]
+    if len(suffixes) >= 2 and suffixes[-1] in COMPRESSION_SUFFIXES:
+        return "".join(suffixes[-2:])
+    return suffixes[-1] if suffixes else ""
+
 def sanitize_table_name(filename: str) -> str:
     """
     Given a filename (with or without extension), return a deterministic,
     safe table name prefixed with TABLE_PREFIX. Replace special chars/spaces with underscores.
-    Example: "My file (v1).csv" -> "Data_Set_My_file_v1"
+    Example: "My file (v1).csv" -> "Data_Set_My_file_v1", "daily.csv.gz" -> "Data_Set_daily"
     """
     base = Path(filename).stem  # drop extension
+    if Path(filename).suffix.lower() in COMPRESSION_SUFFIXES:
+        base = Path(base).stem  # and the inner one of compressed files
     s = re.sub(r"[^\w]+", "_", base.strip())  # replace non-word chars with underscore
     s = re.sub(r"_{2,}", "_", s).strip("_")
     if re.match(r"^\d", s):
         s = "t_" + s
     return f"{TABLE_PREFIX}{s}"
 
+def sheet_table_names(filename: str, sheets: List[str]) -> Dict[str, str]:
+    """
+    Table name per workbook sheet: the file's table name plus the sanitized
+    sheet name, e.g. ("Sales.xlsx", "Q1 2024") -> "Data_Set_Sales_Q1_2024".
+    """
+    base = sanitize_table_name(filename)
+    names: Dict[str, str] = {}
+    used = set()
+    for i, sheet in enumerate(sheets):
+        part = re.sub(r"_{2,}", "_", re.sub(r"[^\w]+", "_", str(sheet).strip())).strip("_") or f"sheet{i + 1}"
+        name = f"{base}_{part}"
+        if name in used:
+            name = f"{name}_{i + 1}"
+        used.add(name)
+        names[sheet] = name
+    return names
+
 
 def normalize_colname(col: str) -> str:
     """Make a column name safe: lowercase, underscores, remove special chars."""
@@ -51,50 +83,206 @@ def unique_column_names(cols: List[str]) -> List[str]:
         out.append(nc)
     return out
 
-# Helper: infer SQL type for a pandas Series
-def infer_sql_type(sr: pd.Series) -> str:
-    non_null = sr.dropna()
-    if non_null.empty:
-        return "TEXT"
+# ---------- Type inference ----------
+# Types are chosen from the whole leading chunk: the narrowest exact type every
+# non-null value fits. Later chunks are re-checked with chunk_sql_type and the
+# column widened with merge_sql_types (see ingest_service.widen_table_columns) when needed.
 
-    # Work with string representations for some checks
-    sample = non_null.astype(str).sample(min(len(non_null), 500), random_state=0) if len(non_null) > 500 else non_null.astype(str)
+INTEGER_TYPES = ("SMALLINT", "INTEGER", "BIGINT")
+NUMERIC_TYPES = INTEGER_TYPES + ("DOUBLE PRECISION", "NUMERIC")
+# widening order within the numeric family
+_NUMERIC_RANK = {"SMALLINT": 0, "INTEGER": 1, "BIGINT": 2, "DOUBLE PRECISION": 3, "NUMERIC": 4}
+_INTEGER_BOUNDS = [("SMALLINT", 2**15 - 1), ("INTEGER", 2**31 - 1), ("BIGINT", 2**63 - 1)]
 
-    # 1) Datetime detection
-    parsed_dt = pd.to_datetime(sample, errors="coerce", infer_datetime_format=True)
-    valid_dt_frac = parsed_dt.notna().mean()
-    if valid_dt_frac >= 0.9:
-        # if all values lack time part we could choose DATE, but default to TIMESTAMP
-        return "TIMESTAMP"
+_CURRENCY_RE = r"[$€£¥₹,]"
+_INTEGER_TEXT_RE = r"[+-]?\d+(?:\.0*)?"
+_BOOL_WORDS = {"true", "false", "t", "f", "yes", "no"}
+
+def clean_numeric_text(sr: pd.Series) -> pd.Series:
+    """
+    Strip currency symbols, thousands separators and surrounding whitespace
+    from numeric looking text; accounting negatives "(1,234.50)" become
+    "-1234.50". Inner whitespace is kept, so "555 123 4567" is not a number.
+    """
+    text = sr.astype(str).str.strip()
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    text = text.str.strip("()").str.replace(_CURRENCY_RE, "", regex=True).str.strip()
+    return text.where(~negative, "-" + text)
+
+def _to_numbers(sr: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(sr) and not pd.api.types.is_bool_dtype(sr):
+        return sr
+    return pd.to_numeric(clean_numeric_text(sr), errors="coerce")
+
+def _parse_int(text: str) -> Optional[int]:
+    value = int(text.split(".")[0])
+    return value if -2**63 <= value < 2**63 else None
+
+def _to_integers(sr: pd.Series) -> pd.Series:
+    """
+    Exact nullable Int64 values; NULL where a cell is not a whole number in
+    BIGINT range. Text is parsed with int(), never through float64, so large
+    identifiers keep every digit.
+    """
+    if pd.api.types.is_integer_dtype(sr):
+        return sr.astype("Int64")
+    # built from Python ints and None: a mapped Series holding a NULL would be
+    # float64 and round anything above 2^53
+    if pd.api.types.is_float_dtype(sr):
+        whole = (sr == sr.round()) & (sr.abs() < 2.0**63)
+        values = [int(v) if ok else None for v, ok in zip(sr, whole)]
+    else:
+        cleaned = clean_numeric_text(sr)
+        whole = cleaned.str.fullmatch(_INTEGER_TEXT_RE).fillna(False).astype(bool) & sr.notna()
+        values = [_parse_int(v) if ok else None for v, ok in zip(cleaned, whole)]
+    return pd.Series(pd.array(values, dtype="Int64"), index=sr.index, name=sr.name)
+
+def parse_datetimes(sr: pd.Series) -> pd.Series:
+    """Parse to datetimes (NaT when unparseable), trying the inferred format before per-value parsing."""
+    if pd.api.types.is_datetime64_any_dtype(sr):
+        return sr
+    parsed = pd.to_datetime(sr, errors="coerce")
+    if parsed.isna().sum() > sr.isna().sum():
+        parsed = pd.to_datetime(sr, errors="coerce", format="mixed")
+    return parsed
 
-    # 2) Boolean detection (common textual booleans)
-    bool_like = sample.str.lower().isin({"true", "false", "t", "f", "yes", "no", "1", "0"})
-    if bool_like.mean() >= 0.95:
+def chunk_sql_type(sr: pd.Series) -> Optional[str]:
+    """
+    Narrowest SQL type that every non-null value of `sr` fits exactly, or None
+    when the series is all null (compatible with any type).
+    """
+    non_null = sr.dropna()
+    if non_null.empty:
+        return None
+    if pd.api.types.is_bool_dtype(non_null):
+        return "BOOLEAN"
+    text = non_null.astype(str).str.strip()
+
+    # 1) Boolean words (pure 0/1 columns fall through to SMALLINT)
+    lowered = text.str.lower()
+    if lowered.isin(_BOOL_WORDS | {"1", "0"}).all() and lowered.isin(_BOOL_WORDS).any():
         return "BOOLEAN"
 
-    # 3) Numeric detection
-    numeric = pd.to_numeric(sample, errors="coerce")
-    valid_num_frac = numeric.notna().mean()
-    if valid_num_frac >= 0.9:
+    # 2) Numbers, allowing currency symbols and thousands separators
+    numbers = _to_numbers(non_null)
+    if numbers.notna().all():
+        cleaned = clean_numeric_text(text)
+        # leading zeros (zip codes, account numbers) are identifiers, keep them as text
+        if cleaned.str.match(r"^-?0\d").any():
+            return "TEXT"
+        if not (numbers.abs() < float("inf")).all():
+            return "DOUBLE PRECISION"
+        if (numbers == numbers.round()).all() and not cleaned.str.contains(r"[.eE]").any():
+            # bounds from the exact values; float64 is off by up to 1024 near the BIGINT limit
+            integers = _to_integers(non_null)
+            if integers.notna().all():
+                bound = max(abs(int(integers.min())), abs(int(integers.max())))
+                for sql_type, limit in _INTEGER_BOUNDS:
+                    if bound <= limit:
+                        return sql_type
+            return "NUMERIC"
+        # currency amounts stay exact; plain measurements stay fast floats
+        if text.str.contains(r"[$€£¥₹,()]").any():
+            return "NUMERIC"
         return "DOUBLE PRECISION"
 
-    # 4) Fallback to text/varchar with length heuristics
-    max_len = int(sample.str.len().max())
-    # if very long, use TEXT
-    if max_len > 1000:
-        return "TEXT"
-    # otherwise use VARCHAR with some margin
-    # round up to nearest 25
-    
+    # 3) Dates / timestamps (values without any digit, e.g. month names, stay text)
+    if text.str.contains(r"\d").all() and parse_datetimes(text.head(100)).notna().all():
+        parsed = parse_datetimes(text)
+        if parsed.notna().all():
+            has_time = text.str.contains(":").any() or (parsed != parsed.dt.normalize()).any()
+            return "TIMESTAMP" if has_time else "DATE"
+
+    return "TEXT"
+
+def infer_sql_type(sr: pd.Series) -> str:
+    """Infer the column type from a whole (leading) chunk; all-null columns are TEXT."""
+    return chunk_sql_type(sr) or "TEXT"
+
+def merge_sql_types(current: str, observed: Optional[str]) -> str:
+    """Smallest type that holds values of both `current` and `observed`."""
+    if observed is None or observed == current:
+        return current
+    if current in _NUMERIC_RANK and observed in _NUMERIC_RANK:
+        return max(current, observed, key=_NUMERIC_RANK.get)
+    if {current, observed} == {"DATE", "TIMESTAMP"}:
+        return "TIMESTAMP"
     return "TEXT"
 
-def create_table_with_types(conn: psycopg2.extensions.connection, table_name: str, columns: list, types_map: Dict[str, str]):
+# information_schema.columns.data_type -> the type names used by infer_sql_type
+_PG_TYPE_NAMES = {
+    "timestamp without time zone": "TIMESTAMP",
+    "date": "DATE",
+    "boolean": "BOOLEAN",
+    "smallint": "SMALLINT",
+    "integer": "INTEGER",
+    "bigint": "BIGINT",
+    "numeric": "NUMERIC",
+    "double precision": "DOUBLE PRECISION",
+    "text": "TEXT",
+}
+
+def sql_type_from_pg(data_type: str) -> str:
+    """Map an information_schema data_type back to the ingest type name (TEXT if unknown)."""
+    return _PG_TYPE_NAMES.get(data_type.lower(), "TEXT")
+
+_BOOL_TOKENS = {"true": "t", "t": "t", "yes": "t", "1": "t",
+                "false": "f", "f": "f", "no": "f", "0": "f"}
+
+def normalize_chunk(df: pd.DataFrame, types_map: Dict[str, str]) -> pd.DataFrame:
+    """
+    Coerce the cells of one chunk (raw text from CSV/xlsx, typed values from
+    Parquet/Arrow) into values Postgres COPY accepts for the column types.
+    Cells that cannot be parsed become NULL.
+    """
+    for col, col_type in types_map.items():
+        if col_type in ("TIMESTAMP", "DATE"):
+            try:
+                parsed = parse_datetimes(df[col])
+            except Exception:
+                # Fallback: treat everything as NaT (will be emptied)
+                parsed = pd.Series([pd.NaT] * len(df), index=df.index)
+            if getattr(parsed.dt, "tz", None) is not None:
+                # TIMESTAMP has no zone; store instants as UTC
+                parsed = parsed.dt.tz_convert("UTC").dt.tz_localize(None)
+
+            # Log a few unparseable samples for debugging
+            bad_mask = parsed.isna() & df[col].notna()
+            if bad_mask.any():
+                bad_samples = df.loc[bad_mask, col].head(5).tolist()
+                print(f"[warn] Unparseable values in column '{col}': {bad_samples}")
+
+            # Format parsed datetimes to Postgres-friendly 'YYYY-MM-DD[ HH:MM:SS]' (NaT stays null)
+            df[col] = parsed.dt.strftime("%Y-%m-%d %H:%M:%S" if col_type == "TIMESTAMP" else "%Y-%m-%d")
+        elif col_type == "DOUBLE PRECISION":
+            df[col] = _to_numbers(df[col])
+        elif col_type in INTEGER_TYPES:
+            # exact parse; non-integral values would be rejected by COPY, so they become NULL like other bad cells
+            df[col] = _to_integers(df[col])
+        elif col_type == "NUMERIC":
+            sr = df[col]
+            if pd.api.types.is_numeric_dtype(sr):
+                df[col] = sr
+            else:
+                # keep the cleaned decimal text so COPY stores it exactly
+                cleaned = clean_numeric_text(sr)
+                df[col] = cleaned.where(pd.to_numeric(cleaned, errors="coerce").notna())
+        elif col_type == "BOOLEAN":
+            sr = df[col]
+            text = sr.where(sr.isna(), sr.astype(str)).str.strip().str.lower()
+            df[col] = text.map(_BOOL_TOKENS)
+    return df
+
+def create_table_with_types(conn: psycopg2.extensions.connection, table_name: str, columns: list, types_map: Dict[str, str],
+                            partition_by: Optional[str] = None):
     """
     Drop table if exists and create with inferred column types.
+    With `partition_by` the table is created PARTITION BY RANGE on that column
+    (partitions are added by core.partitioning).
     """
     with conn.cursor() as cur:
-        # drop if exists
-        cur.execute(sql.SQL("DROP TABLE IF EXISTS {} CASCADE").format(sql.Identifier(table_name)))
+        # drop if exists (an encoded dataset is a view over several tables)
+        drop_dataset(cur, table_name)
         # build column definitions
         col_defs = []
         for col in columns:
@@ -105,5 +293,7 @@ def create_table_with_types(conn: psycopg2.extensions.connection, table_name: st
             sql.Identifier(table_name),
             sql.SQL(", ").join(col_defs),
         )
+        if partition_by:
+            create_stmt += sql.SQL(" PARTITION BY RANGE ({})").format(sql.Identifier(partition_by))
         cur.execute(create_stmt)
     conn.commit()
\ No newline at end of file
@@ -1,8 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from routers.ingest import router as ingest_router
 from routers.analyze import router as analyze_router
-from workflow.workflow import Workflow
+from services.ingest_jobs import shutdown_executor
+from services.dataset_gc import run_sweeper
+from core.config import DATASET_GC_ENABLED
+from core.db_pool import close_pg_pool, get_async_pool, close_async_pool
+from workflow.workflow import get_workflow
+import asyncio
 import os
 from dotenv import load_dotenv
 
@@ -12,7 +18,21 @@ load_dotenv()
 # Get CORS allowed origins from environment variable
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # open the async query pool up front rather than on the first question
+    await get_async_pool()
+    # drop expired / over-budget datasets in the background
+    sweeper = asyncio.create_task(run_sweeper()) if DATASET_GC_ENABLED else None
+    yield
+    if sweeper:
+        sweeper.cancel()
+    # stop the ingest worker pool along with the API process
+    shutdown_executor()
+    close_pg_pool()
+    await close_async_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -23,8 +43,8 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# for deployment on langgraph cloud
-graph = Workflow().returnGraph()
+# for deployment on langgraph cloud; built at startup and shared with /analyze requests
+graph = get_workflow().graph
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,12 @@
+from typing import Optional, Dict, Any
+from pydantic import BaseModel
+
+class IngestJob(BaseModel):
+    job_id: str
+    file_name: str
+    stage: str                      # queued / parsing / loading / merging / encoding / optimizing / registering / completed / failed
+    rows_processed: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    result: Optional[Dict[str, Any]] = None   # UploadResult once completed
+    error: Optional[str] = None
@@ -1,5 +1,14 @@
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 
 class UploadResult(BaseModel):
     table_name: str
-    rows_loaded: int
\ No newline at end of file
+    rows_loaded: int
+    mode: str = "replace"
+    rows_inserted: Optional[int] = None   # append mode only
+    rows_updated: Optional[int] = None    # append mode with a key column
+    total_rows: Optional[int] = None      # append mode: table size after the append
+    sheets: Optional[List[Dict[str, Any]]] = None  # per-sheet table_name/rows_loaded of multi-sheet workbooks
+    encoded_columns: Optional[List[str]] = None   # columns stored as dictionary codes behind the dataset view
+    partitioned_by: Optional[str] = None          # range-partition column of large time-series uploads
+    optimization: Optional[Dict[str, Any]] = None  # ANALYZE/index report from the post-ingest stage
\ No newline at end of file
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from core.config import ALLOWED_VIZ, MAX_ROWS_SERVER, MAX_QUERY_LENGTH, REQUEST_TIMEOUT_SECONDS
+from fastapi import APIRouter, Depends, HTTPException, Request
+from core.config import ALLOWED_VIZ, MAX_ROWS_SERVER, MAX_QUERY_LENGTH, REQUEST_TIMEOUT_SECONDS, DISCONNECT_POLL_SECONDS
 from models.WorkflowModels import *
-from workflow.workflow import Workflow
+from workflow.workflow import get_workflow
+from workflow.LLMconfig import get_llm_manager
+from workflow.DBhandler import cache_stats as query_cache_stats
 import logging
 import httpx
 import asyncio
@@ -10,8 +12,17 @@ logger = logging.getLogger("api_router_query_noauth")
 
 router = APIRouter()
 
+async def _cancel_on_disconnect(request: Request, task: asyncio.Task, disconnected: asyncio.Event):
+    """Cancel the workflow (and with it any running statement) once the client has gone away."""
+    while not task.done():
+        if await request.is_disconnected():
+            disconnected.set()
+            task.cancel()
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
 @router.post("/query")
-async def run_query(req: QueryRequest):
+async def run_query(req: QueryRequest, request: Request):
     # Basic validation
     q = (req.user_query or "").strip()
     if not q:
@@ -23,9 +34,17 @@ async def run_query(req: QueryRequest):
         raise HTTPException(status_code=400, detail="dataset_id cannot be empty")
 
     # Call LangGraph worker
+    workflow = asyncio.create_task(get_workflow().aexecute_workflow(user_query=q, table_id=ds))
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, workflow, disconnected))
     try:
-        result = Workflow().execute_workflow(user_query=q, table_id=ds)
+        result = await workflow
         return result
+    except asyncio.CancelledError:
+        if not disconnected.is_set():
+            raise
+        logger.info("Client disconnected, analyze workflow for %s cancelled", ds)
+        raise HTTPException(status_code=499, detail="Client closed request")
     except HTTPException:
         raise
     except httpx.RequestError as e:
@@ -35,4 +54,11 @@ async def run_query(req: QueryRequest):
         raise HTTPException(status_code=504, detail="LangGraph worker timed out")
     except Exception as e:
         logger.exception("Unexpected error calling LangGraph: %s", e)
-        raise HTTPException(status_code=500, detail="Internal error while calling LangGraph")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal error while calling LangGraph")
+    finally:
+        watcher.cancel()
+
+@router.get("/cache")
+def cache_stats():
+    """Hit/miss counters of the query-path caches."""
+    return {"llm": get_llm_manager().cache_stats(), **query_cache_stats()}
@@ -1,19 +1,52 @@
 # app/routers/ingest.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict
-from services.ingest_service import process_upload_file
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from typing import Optional
+from core.config import TABLE_PREFIX
+from core.utility import sanitize_table_name, normalize_colname
+from models.IngestJobModel import IngestJob
+from services.ingest_jobs import submit_upload, get_job
 
 router = APIRouter()
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)) -> Dict:
+@router.post("/upload", status_code=202, response_model=IngestJob)
+async def upload_file(
+    file: UploadFile = File(...),
+    mode: str = Form("replace"),
+    table_name: Optional[str] = Form(None),
+    key_column: Optional[str] = Form(None),
+) -> IngestJob:
     """
-    Upload endpoint that accepts .csv or .xlsx files.
-    Delegates processing to the ingest service.
+    Upload a .csv (optionally .csv.gz / .csv.zst compressed), .xlsx, .parquet
+    or Arrow IPC (.arrow / .feather / .ipc) file. The file is spooled to disk
+    and ingested by a background job; the response is 202 with an IngestJob
+    (stage "queued", or "completed" at once when identical content was
+    already ingested). Poll /ingest/jobs/{job_id} for progress and the final
+    table name.
+    mode="replace" (default) (re)creates the dataset table from the file.
+    mode="append" adds the file's rows to `table_name` (defaults to the
+    table the filename maps to), upserting by `key_column` when given.
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
+    if mode not in ("replace", "append"):
+        raise HTTPException(status_code=400, detail="mode must be 'replace' or 'append'")
 
-    # delegate the heavy lifting to the service (which uses temp files internally)
-    result = await process_upload_file(file)  # returns dict with table_name and rows_loaded
-    return result
+    append_to = None
+    if mode == "append":
+        append_to = (table_name or "").strip() or sanitize_table_name(file.filename)
+        if not append_to.startswith(TABLE_PREFIX):
+            raise HTTPException(status_code=400, detail=f"Can only append to {TABLE_PREFIX} tables")
+        key_column = normalize_colname(key_column) if key_column else None
+    else:
+        key_column = None
+
+    # parsing, type inference and COPY run in the ingest worker pool
+    return await submit_upload(file, append_to=append_to, key_column=key_column)
+
+@router.get("/jobs/{job_id}", response_model=IngestJob)
+def get_upload_job(job_id: str) -> IngestJob:
+    """Report the stage, rows processed and throughput of an ingest job."""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job '{job_id}'")
+    return job
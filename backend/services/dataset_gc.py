@@ -0,0 +1,179 @@
+from typing import Dict, Any, List
+from core.config import (TABLE_PREFIX, DATASET_RETENTION_HOURS, DATASET_SIZE_BUDGET_BYTES,
+                         DATASET_GC_INTERVAL_SECONDS, INGEST_JOB_STALE_SECONDS)
+from core.db_pool import pooled_connection
+from core.catalog import ensure_master_repository, ensure_column_profiles
+from core.encoding import drop_dataset
+import asyncio
+import time
+
+# The sweeper drops Data_Set_ datasets that have not been queried (or created)
+# within DATASET_RETENTION_HOURS, then the least recently used ones while all
+# datasets together exceed DATASET_SIZE_BUDGET_BYTES, and finally Data_Set_
+# relations with no master_data_repository entry. Every drop is recorded in
+# dataset_gc_log with the bytes it reclaimed. It runs in a background task of
+# the API process, one sweeper at a time across processes (advisory lock).
+# The sweeper's statements are catalog lookups and DROPs, so the pool's default
+# statement_timeout applies.
+
+_GC_LOCK = "dataset_gc"
+
+def _ensure_gc_log(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS dataset_gc_log (
+            id BIGSERIAL PRIMARY KEY,
+            table_name VARCHAR(255),
+            reason VARCHAR(32),
+            bytes_reclaimed BIGINT,
+            dropped_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def dataset_size_bytes(cur, table_name: str) -> int:
+    """On-disk size of a dataset including indexes, partitions and, for encoded datasets, the backing tables."""
+    cur.execute("""
+        WITH root AS (SELECT to_regclass(format('%%I', %s)) AS oid),
+        rels AS (
+            SELECT oid FROM root
+            UNION SELECT i.inhrelid FROM pg_inherits i, root WHERE i.inhparent = root.oid
+            UNION SELECT to_regclass(format('%%I', u.table_name)) FROM information_schema.view_table_usage u
+                  WHERE u.view_schema = 'public' AND u.view_name = %s
+        )
+        SELECT COALESCE(SUM(pg_total_relation_size(oid)), 0) FROM rels WHERE oid IS NOT NULL
+    """, (table_name, table_name))
+    return int(cur.fetchone()[0])
+
+def _drop(conn, table_name: str, reason: str, size: int) -> bool:
+    """Drop one dataset with its catalog rows and log it; a failure (e.g. lock timeout) skips it."""
+    try:
+        with conn.cursor() as cur:
+            drop_dataset(cur, table_name)
+            cur.execute("DELETE FROM master_data_repository WHERE file_name = %s", (table_name,))
+            cur.execute("DELETE FROM column_profiles WHERE table_name = %s", (table_name,))
+            cur.execute("INSERT INTO dataset_gc_log (table_name, reason, bytes_reclaimed) VALUES (%s, %s, %s)",
+                        (table_name, reason, size))
+        conn.commit()
+        print(f"[gc] Dropped {table_name} ({reason}), reclaimed {size} bytes")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"[warn] GC could not drop {table_name}: {e}")
+        return False
+
+def _ingest_running(cur) -> bool:
+    """
+    Whether an ingest job may be creating a not-yet-registered table right now.
+    A load or index build can run for hours, so liveness is judged by the job's
+    heartbeat (updated_at), not its age; a job that stopped heartbeating is dead.
+    """
+    cur.execute("SELECT to_regclass('public.ingest_jobs') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM ingest_jobs
+            WHERE stage NOT IN ('completed', 'failed')
+              AND updated_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+        )
+    """, (INGEST_JOB_STALE_SECONDS,))
+    return cur.fetchone()[0]
+
+def _orphans(cur) -> List[str]:
+    """Data_Set_ tables/views that no repository entry (or encoded dataset) owns."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+          AND c.relkind IN ('r', 'p', 'v')
+          AND NOT c.relispartition
+          AND starts_with(c.relname, %s)
+          AND c.relname::text NOT IN (SELECT file_name FROM master_data_repository)
+          AND c.relname::text NOT IN (SELECT table_name::text FROM information_schema.view_table_usage
+                                      WHERE view_schema = 'public')
+    """, (TABLE_PREFIX,))
+    return [name for (name,) in cur.fetchall()]
+
+def sweep_datasets() -> Dict[str, Any]:
+    """One GC pass. Blocking; returns {"dropped": [...], "bytes_reclaimed": ..., "elapsed_ms": ...}."""
+    started = time.perf_counter()
+    report: Dict[str, Any] = {"dropped": [], "bytes_reclaimed": 0}
+    with pooled_connection() as conn:
+        locked = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (_GC_LOCK,))
+                if not cur.fetchone()[0]:
+                    return {"skipped": "another sweeper is running"}
+                locked = True
+                ensure_master_repository(cur)
+                ensure_column_profiles(cur)
+                _ensure_gc_log(cur)
+                # never queue behind a long-running query; the dataset is retried next pass
+                cur.execute("SET lock_timeout = '5s'")
+                cur.execute("""
+                    SELECT file_name,
+                           to_regclass(format('%%I', file_name)) IS NOT NULL AS present,
+                           %s > 0 AND COALESCE(last_queried_at, created_at) < CURRENT_TIMESTAMP - make_interval(secs => %s) AS expired
+                    FROM master_data_repository
+                    ORDER BY COALESCE(last_queried_at, created_at)
+                """, (DATASET_RETENTION_HOURS, DATASET_RETENTION_HOURS * 3600))
+                datasets = cur.fetchall()
+            conn.commit()
+
+            def drop(table_name: str, reason: str, size: int):
+                if _drop(conn, table_name, reason, size):
+                    report["dropped"].append({"table_name": table_name, "reason": reason, "bytes": size})
+                    report["bytes_reclaimed"] += size
+
+            # 1) repository entries whose table is already gone, then expired datasets
+            live = []
+            for table_name, present, expired in datasets:
+                if not present:
+                    drop(table_name, "missing", 0)
+                elif expired:
+                    with conn.cursor() as cur:
+                        drop(table_name, "expired", dataset_size_bytes(cur, table_name))
+                else:
+                    live.append(table_name)
+
+            # 2) least recently used first while over the size budget
+            if DATASET_SIZE_BUDGET_BYTES > 0:
+                with conn.cursor() as cur:
+                    sizes = [(name, dataset_size_bytes(cur, name)) for name in live]
+                total = sum(size for _, size in sizes)
+                for table_name, size in sizes:
+                    if total <= DATASET_SIZE_BUDGET_BYTES:
+                        break
+                    drop(table_name, "size_budget", size)
+                    total -= size
+
+            # 3) relations left behind by failed ingests or old expiry logic
+            with conn.cursor() as cur:
+                orphans = [] if _ingest_running(cur) else _orphans(cur)
+                sizes = [(name, dataset_size_bytes(cur, name)) for name in orphans]
+            conn.commit()
+            for table_name, size in sizes:
+                drop(table_name, "orphan", size)
+        finally:
+            # the connection goes back to the pool: release the session lock and setting explicitly
+            if not conn.closed:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    if locked:
+                        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (_GC_LOCK,))
+                    cur.execute("RESET lock_timeout")
+                conn.commit()
+
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if report["dropped"]:
+        print(f"[gc] Sweep dropped {len(report['dropped'])} datasets, reclaimed {report['bytes_reclaimed']} bytes")
+    return report
+
+async def run_sweeper():
+    """Background task: sweep every DATASET_GC_INTERVAL_SECONDS in a worker thread, off the request path."""
+    while True:
+        try:
+            await asyncio.to_thread(sweep_datasets)
+        except Exception as e:
+            print(f"[warn] Dataset GC sweep failed: {e}")
+        await asyncio.sleep(DATASET_GC_INTERVAL_SECONDS)
@@ -0,0 +1,325 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from psycopg2.extras import Json
+from typing import Dict, Any, Optional, Set
+from core.config import (INGEST_WORKERS, UPLOAD_READ_CHUNK_BYTES, INGEST_JOB_HEARTBEAT_SECONDS,
+                         INGEST_JOB_STALE_SECONDS)
+from core.db_pool import pooled_connection
+from core.catalog import ensure_master_repository, find_datasets_by_hash, touch_dataset
+from models.IngestJobModel import IngestJob
+from services.ingest_service import ingest_file, validate_upload_filename
+import hashlib
+import multiprocessing
+import tempfile
+import threading
+import time
+import uuid
+import os
+
+# Ingest jobs run in a pool of worker processes so pandas parsing and COPY never
+# block the API event loop. Job state lives in Postgres so any API worker can
+# report on a job that another one accepted. A job whose worker dies (or that
+# raises before recording its outcome) is marked failed by a done-callback, and
+# a pool broken by a dead worker is replaced on the next submit.
+# While a job is queued or running, the API process that submitted it touches
+# its updated_at every INGEST_JOB_HEARTBEAT_SECONDS. A job left unfinished by
+# a crashed or restarted API process stops getting heartbeats, and after
+# INGEST_JOB_STALE_SECONDS it is failed (on the next poll) and no longer
+# counts as running for the dataset GC.
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_jobs_table_ready = False
+_in_flight: Set[str] = set()
+_in_flight_lock = threading.Lock()
+_heartbeat: Optional[threading.Thread] = None
+
+def _ensure_jobs_table(cur):
+    """CREATE the ingest_jobs table once per process rather than on every poll."""
+    global _jobs_table_ready
+    if _jobs_table_ready:
+        return
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            job_id VARCHAR(36) PRIMARY KEY,
+            file_name VARCHAR(255),
+            stage VARCHAR(32),
+            rows_processed BIGINT DEFAULT 0,
+            result JSONB,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    _jobs_table_ready = True
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn keeps the workers free of the API process's event loop and sockets
+            _executor = ProcessPoolExecutor(max_workers=INGEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+def _replace_broken_executor(broken: ProcessPoolExecutor, shutdown: bool = True):
+    """Drop a pool whose worker died; get_executor() builds a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    if shutdown:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _mark_failed(job_id: str, error: str):
+    """Record a failure unless the job already reached a final stage."""
+    with pooled_connection(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE ingest_jobs
+            SET stage = 'failed', error = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE job_id = %s AND stage NOT IN ('completed', 'failed')
+        """, (error, job_id))
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(INGEST_JOB_HEARTBEAT_SECONDS)
+        with _in_flight_lock:
+            job_ids = list(_in_flight)
+        if not job_ids:
+            continue
+        try:
+            with pooled_connection(autocommit=True) as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE ingest_jobs SET updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ANY(%s) AND stage NOT IN ('completed', 'failed')
+                """, (job_ids,))
+        except Exception as e:
+            print(f"[warn] Ingest job heartbeat failed: {e}")
+
+def _track_job(job_id: str):
+    """Heartbeat `job_id` until its future completes; starts the heartbeat thread on first use."""
+    global _heartbeat
+    with _in_flight_lock:
+        _in_flight.add(job_id)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_heartbeat_loop, name="ingest-job-heartbeat", daemon=True)
+            _heartbeat.start()
+
+def _fail_stale_jobs(cur):
+    """Fail unfinished jobs whose heartbeat stopped, i.e. the process that owned them is gone."""
+    cur.execute("""
+        UPDATE ingest_jobs
+        SET stage = 'failed', error = 'Ingest job was lost (the server restarted or its worker exited)',
+            updated_at = CURRENT_TIMESTAMP
+        WHERE stage NOT IN ('completed', 'failed')
+          AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    """, (INGEST_JOB_STALE_SECONDS,))
+
+def _on_job_done(job_id: str, path: str, executor: ProcessPoolExecutor, future: Future):
+    """Executor callback: fail jobs that never recorded an outcome (worker killed, pool broken, cancelled)."""
+    with _in_flight_lock:
+        _in_flight.discard(job_id)
+    if future.cancelled():
+        error = "Ingest job was cancelled"
+    elif future.exception() is not None:
+        error = f"Ingest worker failed: {future.exception()!r}"
+        if isinstance(future.exception(), BrokenProcessPool):
+            # runs on the pool's own management thread, which is already tearing it down
+            _replace_broken_executor(executor, shutdown=False)
+    else:
+        return
+    print(f"[warn] Ingest job {job_id}: {error}")
+    try:
+        _mark_failed(job_id, error)
+    except Exception as e:
+        print(f"[warn] Could not mark ingest job {job_id} failed: {e}")
+    try:
+        os.unlink(path)  # the worker's own cleanup may never have run
+    except OSError:
+        pass
+
+def _submit_job(job_id: str, path: str, filename: str, content_hash: str,
+                append_to: Optional[str], key_column: Optional[str]):
+    """Hand a queued job to the worker pool, replacing the pool once if a dead worker broke it."""
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            future = executor.submit(run_ingest_job, job_id, path, filename, content_hash, append_to, key_column)
+        except BrokenProcessPool:
+            print("[warn] Ingest worker pool is broken, starting a new one")
+            _replace_broken_executor(executor)
+            if attempt:
+                raise
+            continue
+        _track_job(job_id)
+        future.add_done_callback(lambda f: _on_job_done(job_id, path, executor, f))
+        return
+
+
+class _JobReporter:
+    """Writes stage/progress updates for one job from inside a worker process."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def update(self, stage: str, rows_processed: Optional[int] = None, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        # a short autocommit checkout per update, so progress is visible while the load's transaction is open
+        with pooled_connection(autocommit=True) as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE ingest_jobs
+                SET stage = %s,
+                    rows_processed = COALESCE(%s, rows_processed),
+                    result = COALESCE(%s, result),
+                    error = %s,
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = %s
+            """, (stage, rows_processed, Json(result) if result is not None else None, error, self.job_id))
+
+
+def run_ingest_job(job_id: str, path: str, filename: str, content_hash: str,
+                   append_to: Optional[str] = None, key_column: Optional[str] = None):
+    """Worker-process entry point: ingest the spooled upload and record the outcome."""
+    reporter = _JobReporter(job_id)
+    try:
+        result = ingest_file(Path(path), filename, content_hash,
+                             progress=lambda stage, rows: reporter.update(stage, rows),
+                             append_to=append_to, key_column=key_column)
+        reporter.update("completed", result.get("rows_loaded"), result=result)
+    except HTTPException as e:
+        reporter.update("failed", error=str(e.detail))
+    except Exception as e:
+        print(f"Ingest job {job_id} failed: {e}")
+        reporter.update("failed", error=str(e))
+    finally:
+        try:
+            os.unlink(path)
+        except Exception:
+            pass
+
+
+async def submit_upload(upload_file: UploadFile, append_to: Optional[str] = None,
+                        key_column: Optional[str] = None) -> IngestJob:
+    """
+    Spool the upload to a temp file in bounded chunks while hashing its bytes.
+    If identical content was already ingested the job completes immediately with
+    the existing table; otherwise a queued job is handed to the worker pool.
+    Appends (`append_to`) are never deduplicated.
+    Returns immediately with the job's status.
+    """
+    filename = upload_file.filename
+    ext = validate_upload_filename(filename)
+
+    # disk writes, hashing and the catalog DDL below are blocking, so they run in the threadpool
+    hasher = hashlib.sha256()
+    tmp = await run_in_threadpool(tempfile.NamedTemporaryFile, delete=False, suffix=ext)
+
+    def spool(block: bytes):
+        hasher.update(block)
+        tmp.write(block)
+
+    try:
+        while True:
+            block = await upload_file.read(UPLOAD_READ_CHUNK_BYTES)
+            if not block:
+                break
+            await run_in_threadpool(spool, block)
+    except Exception:
+        tmp.close()
+        os.unlink(tmp.name)
+        raise
+    await run_in_threadpool(tmp.close)
+    content_hash = hasher.hexdigest()
+
+    job_id = str(uuid.uuid4())
+    result = await run_in_threadpool(_register_job, job_id, filename, content_hash, append_to)
+
+    if result is not None:
+        os.unlink(tmp.name)
+        return IngestJob(job_id=job_id, file_name=filename, stage="completed",
+                         rows_processed=result["rows_loaded"], result=result)
+
+    try:
+        _submit_job(job_id, tmp.name, filename, content_hash, append_to, key_column)
+    except Exception as e:
+        await run_in_threadpool(_mark_failed, job_id, f"Could not start ingest job: {e}")
+        os.unlink(tmp.name)
+        raise HTTPException(status_code=503, detail="Ingest workers are unavailable, please retry")
+    return IngestJob(job_id=job_id, file_name=filename, stage="queued")
+
+
+def _register_job(job_id: str, filename: str, content_hash: str, append_to: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Insert the job row. If identical content was already ingested the job is
+    recorded as completed and its result returned; otherwise it is queued and
+    None is returned. Blocking.
+    """
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            _ensure_jobs_table(cur)
+            ensure_master_repository(cur)
+            existing = [] if append_to else find_datasets_by_hash(cur, content_hash)
+            result = None
+            if existing:
+                row_count = sum(rows for _, rows in existing)
+                result = {"table_name": existing[0][0], "rows_loaded": row_count}
+                if len(existing) > 1:
+                    result["sheets"] = [{"table_name": name, "rows_loaded": rows} for name, rows in existing]
+                # the re-upload counts as use, so the GC does not drop the table it was handed
+                for name, _ in existing:
+                    touch_dataset(cur, name)
+                cur.execute("""
+                    INSERT INTO ingest_jobs (job_id, file_name, stage, rows_processed, result)
+                    VALUES (%s, %s, 'completed', %s, %s)
+                """, (job_id, filename, row_count, Json(result)))
+            else:
+                cur.execute("""
+                    INSERT INTO ingest_jobs (job_id, file_name, stage)
+                    VALUES (%s, %s, 'queued')
+                """, (job_id, filename))
+        conn.commit()
+    return result
+
+
+def get_job(job_id: str) -> Optional[IngestJob]:
+    """Return the current status of a job, or None if it is unknown."""
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            _ensure_jobs_table(cur)
+            _fail_stale_jobs(cur)
+            cur.execute("""
+                SELECT file_name, stage, rows_processed, result, error,
+                       EXTRACT(EPOCH FROM (
+                           CASE WHEN stage IN ('completed', 'failed') THEN updated_at
+                                ELSE CURRENT_TIMESTAMP END - COALESCE(started_at, CURRENT_TIMESTAMP)))
+                FROM ingest_jobs
+                WHERE job_id = %s
+            """, (job_id,))
+            row = cur.fetchone()
+        conn.commit()
+
+    if not row:
+        return None
+    file_name, stage, rows_processed, result, error, elapsed = row
+    elapsed = float(elapsed or 0.0)
+    rows_processed = int(rows_processed or 0)
+    return IngestJob(
+        job_id=job_id,
+        file_name=file_name,
+        stage=stage,
+        rows_processed=rows_processed,
+        elapsed_seconds=round(elapsed, 3),
+        rows_per_second=round(rows_processed / elapsed, 1) if elapsed > 0 else 0.0,
+        result=result,
+        error=error,
+    )
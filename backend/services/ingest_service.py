@@ -1,194 +1,423 @@
 from pathlib import Path
-from fastapi import UploadFile, HTTPException
-import csv
-from typing import List, Dict, Any
-from core.config import ALLOWED_EXT, get_raw_psycopg_conn
+from fastapi import HTTPException
+from typing import List, Dict, Any, BinaryIO, Callable, Iterator, Optional
+from core.config import (ALLOWED_EXT, INGEST_CHUNK_ROWS, INGEST_OPTIMIZE, INGEST_DICTIONARY_ENCODING,
+                         INGEST_PARTITIONING, PARTITION_MIN_BYTES, PARTITION_GRANULARITY,
+                         XLSX_SHEET_WORKERS)
 from core.utility import *
 from core.db_helper import *
-import tempfile
-import pandas as pd
+from core.catalog import (ensure_master_repository, register_dataset, record_append,
+                          ensure_column_profiles, save_column_profiles, load_column_profiles)
+from core.profiler import ColumnProfiler
+from core.columnar import COLUMNAR_EXT, columnar_schema_types, iter_columnar_chunks
+from core.excel import list_sheets, iter_sheet_chunks
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core.optimizer import optimize_table
+from core.db_pool import pooled_connection
+from core.encoding import (base_table_name, encoding_candidates, encode_table,
+                           encoded_columns, append_encoded)
+from core.partitioning import (choose_partition_column, create_default_partition,
+                               ensure_partitions, partitioning_of)
+import gzip
+import itertools
+import multiprocessing
 import os
+import pandas as pd
 
-async def process_upload_file(upload_file: UploadFile) -> Dict[str, Any]:
+def _decompressing_reader(fileobj: BinaryIO, ext: str) -> BinaryIO:
+    """Wrap a compressed CSV so it is decompressed on the fly as pandas reads it."""
+    if ext == ".csv.gz":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if ext == ".csv.zst":
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    return fileobj
+
+def iter_upload_chunks(fileobj: BinaryIO, ext: str) -> Iterator[pd.DataFrame]:
+    """
+    Yield the uploaded file as DataFrames of at most INGEST_CHUNK_ROWS rows.
+    CSV is streamed straight from the spooled upload (gzip/zstd CSV is
+    decompressed on the fly, never to disk) and Parquet/Arrow one
+    record batch at a time, so only one chunk is held in memory at a time.
+    CSV/xlsx cells are read as text; typing happens later. Multi-sheet
+    workbooks are split per sheet by ingest_file, not here.
     """
-    Process UploadFile, infer column types and create table with typed columns,
-    normalize TIMESTAMP-like columns to Postgres-friendly format, then COPY CSV into table.
-    Returns {"table_name":..., "rows_loaded":...}
-    NOTE: this function relies on these helpers you already have:
+    fileobj.seek(0)
+    if ext in COLUMNAR_EXT:
+        yield from iter_columnar_chunks(fileobj, ext)
+    elif ext in (".csv", ".csv.gz", ".csv.zst"):
+        try:
+            reader = pd.read_csv(_decompressing_reader(fileobj, ext), dtype=str, chunksize=INGEST_CHUNK_ROWS)
+        except pd.errors.EmptyDataError:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        yield from reader
+    else:
+        # xlsx: the first worksheet, streamed in read-only mode
+        yield from iter_sheet_chunks(fileobj)
+
+def ingest_connection():
+    """Pooled connection for ingest work: no statement_timeout, COPY and index builds are long by design."""
+    return pooled_connection(statement_timeout_ms=0)
+
+def validate_upload_filename(filename: str) -> str:
+    """Return the lower-cased extension of an upload, or raise 400 if it is not allowed."""
+    ext = file_extension(filename)
+    if ext not in ALLOWED_EXT:
+        raise HTTPException(status_code=400, detail="Incompatible File. Please Upload file .csv/.csv.gz/.csv.zst/.xlsx/.parquet/.arrow")
+    return ext
+
+def ingest_file(path: Path, filename: str, content_hash: Optional[str] = None,
+                progress: Optional[Callable[[str, int], None]] = None,
+                append_to: Optional[str] = None, key_column: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stream the uploaded file at `path` in chunks, infer the narrowest exact
+    column types from the leading chunk and create a table with typed columns
+    (widened as later chunks require), then normalize each chunk and COPY it
+    into the table, so peak memory stays bounded by INGEST_CHUNK_ROWS.
+    Blocking; meant to run inside an ingest job worker process.
+    `content_hash` is recorded in master_data_repository for later deduplication.
+    With `append_to` the rows are appended to that existing table instead
+    (upserted by `key_column` when given), see _append_chunks.
+    Each sheet of a multi-sheet workbook becomes its own table, loaded in
+    parallel worker processes, see _load_workbook_sheets.
+    With INGEST_PARTITIONING, files of at least PARTITION_MIN_BYTES that have
+    a TIMESTAMP/DATE column are range-partitioned on it (see core.partitioning).
+    `progress(stage, rows_processed)` is called as the load advances.
+    Returns {"table_name":..., "rows_loaded":..., "optimization":...}
+    NOTE: this function relies on these helpers:
+      - iter_upload_chunks(fileobj, ext) -> Iterator[DataFrame]
+      - iter_sheet_chunks(path, sheet_name) -> Iterator[DataFrame]
       - unique_column_names(orig_cols) -> list[str]
       - infer_sql_type(series) -> str
+      - normalize_chunk(df, types_map) -> DataFrame
       - sanitize_table_name(filename) -> str
-      - get_raw_psycopg_conn() -> psycopg2 connection
+      - ingest_connection() -> pooled psycopg2 connection
       - create_table_with_types(conn, table_name, columns, types_map)
-      - copy_csv_into_table(conn, tmp_out_path, table_name, columns)
+      - copy_chunk_into_table(conn, df, table_name, columns)
+      - ColumnProfiler(columns, types_map) -> per-column stats saved to column_profiles
+      - optimize_table(conn, table_name, types_map, row_count)
     """
-    print(f"Processing upload file: {upload_file.filename}, content_type={upload_file.content_type}")
-    filename = upload_file.filename
-    ext = Path(filename).suffix.lower()
-    if ext not in ALLOWED_EXT:
-        raise HTTPException(status_code=400, detail="Incompatible File. Please Upload file .csv/.xlsx")
+    print(f"Processing upload file: {filename}")
+    progress = progress or (lambda stage, rows: None)
+    ext = validate_upload_filename(filename)
 
-    # save upload to a temp file (async read)
-    tmp_in = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-    # compute table name
-    table_name = sanitize_table_name(filename)  # you already have this function
+    progress("parsing", 0)
+    with open(path, "rb") as fileobj:
+        if append_to:
+            return _append_chunks(fileobj, ext, append_to, key_column, progress)
+        if ext == ".xlsx":
+            sheets = list_sheets(fileobj)
+            if len(sheets) > 1:
+                return _load_workbook_sheets(path, filename, sheets, content_hash, progress)
 
-    # Check master_data_repository for existing table
-    conn = get_raw_psycopg_conn()
-    try:
-        with conn.cursor() as cur:
-            # First ensure the master_data_repository table exists
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS master_data_repository (
-                file_name VARCHAR(255) PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                row_count INTEGER
-                )
-            """)
-            # Check if table exists in master_data_repository
-            cur.execute("""
-                SELECT created_at 
-                FROM master_data_repository 
-                WHERE file_name = %s
-                LIMIT 1
-            """, (table_name,))
-            
-            result = cur.fetchone()
-            
-            if result:
-                created_at = result[0]
-                created_ts = pd.to_datetime(created_at, utc=True)   # makes it tz-aware (UTC)
-                current_time = pd.Timestamp.now(tz="UTC")   
-                time_diff = current_time - created_ts 
-                
-                # If time difference is more than 6 hours
-                if time_diff.total_seconds() > 6 * 3600:
-                    # Delete the entry from master_data_repository
-                    cur.execute("""
-                        DELETE FROM master_data_repository 
-                        WHERE file_name = %s
-                    """, (table_name,))
-                    conn.commit()
-                else:
-                    # If table exists and time difference is less than 6 hours
-                    # Get the row count and return early
-                    cur.execute("""
-                        SELECT row_count 
-                        FROM master_data_repository 
-                        WHERE file_name = %s
-                    """, (table_name,))
-                    row_count = cur.fetchone()[0]
-                    return {"table_name": table_name, "rows_loaded": int(row_count)}
-    finally:
-        conn.close()
+        # compute table name
+        table_name = sanitize_table_name(filename)  # you already have this function
+        # columnar files carry their types (read before streaming, the reader owns the file position)
+        schema_types = columnar_schema_types(fileobj, ext) if ext in COLUMNAR_EXT else {}
+        partition = INGEST_PARTITIONING and os.path.getsize(path) >= PARTITION_MIN_BYTES
+        return _load_chunks(iter_upload_chunks(fileobj, ext), table_name, content_hash, progress, schema_types, partition)
 
-    try:
-        content = await upload_file.read()
-        tmp_in.write(content)
-        tmp_in.flush()
-        tmp_in.close()
-        tmp_path = Path(tmp_in.name)
-
-        # load to pandas
-        if ext == ".csv":
-            df = pd.read_csv(tmp_path, low_memory=False)
-        else:
-            df = pd.read_excel(tmp_path)
-
-        if df.shape[1] == 0:
-            raise HTTPException(status_code=400, detail="Uploaded file has no columns")
+def _optimize(table_name: str, types_map: Dict[str, str], row_count: int,
+              distinct_counts: Optional[Dict[str, int]], progress: Callable[[str, int], None],
+              dims: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    ANALYZE + indexes; a failure here leaves a usable (if slower) table and is only reported.
+    For an encoded dataset (`dims` given) the base table is optimized.
+    """
+    if not INGEST_OPTIMIZE:
+        return None
+    progress("optimizing", row_count)
+    with ingest_connection() as conn:
+        try:
+            if dims:
+                return optimize_table(conn, base_table_name(table_name), types_map, row_count,
+                                      distinct_counts=distinct_counts, code_columns=list(dims))
+            return optimize_table(conn, table_name, types_map, row_count, distinct_counts=distinct_counts)
+        except Exception as e:
+            conn.rollback()
+            print(f"[warn] Post-ingest optimization failed for {table_name}: {e}")
+            return {"error": str(e)}
 
-        orig_cols = list(df.columns)
-        columns = unique_column_names(orig_cols)  # you already have this function
-        df.columns = columns
-
-        # infer types for each column
-        types_map = {}
-        for col in columns:
-            try:
-                types_map[col] = infer_sql_type(df[col])
-            except Exception:
-                types_map[col] = "TEXT"
-
-        # --- NORMALIZE TIMESTAMP COLUMNS ---
-        # For any column inferred as TIMESTAMP, coerce using pandas and format to
-        # 'YYYY-MM-DD HH:MM:SS' so Postgres COPY into TIMESTAMP succeeds.
-        for col, col_type in types_map.items():
-            if col_type == "TIMESTAMP":
-                # Attempt to parse common timestamp formats (including MM/DD/YYYY hh:mm:ss AM/PM)
-                try:
-                    parsed = pd.to_datetime(df[col], errors="coerce", infer_datetime_format=True)
-                except Exception:
-                    # Fallback: treat everything as NaT (will be emptied)
-                    parsed = pd.Series([pd.NaT] * len(df), index=df.index)
-
-                # Log a few unparseable samples for debugging (optional)
-                bad_mask = parsed.isna() & df[col].notna()
-                if bad_mask.any():
-                    bad_samples = df.loc[bad_mask, col].head(5).tolist()
-                    if bad_samples:
-                        print(f"[warn] Unparseable values in column '{col}': {bad_samples}")
-
-                # Format parsed datetimes to Postgres-friendly 'YYYY-MM-DD HH:MM:SS'
-                # NaT -> NaN -> replaced with empty string
-                df[col] = parsed.dt.strftime("%Y-%m-%d %H:%M:%S")
-                df[col] = df[col].fillna("")
-
-        # prepare a normalized CSV with header matching sanitized column names
-        tmp_out = tempfile.NamedTemporaryFile(delete=False, suffix=".csv", mode="w", encoding="utf-8", newline="")
-        tmp_out_path = Path(tmp_out.name)
-        writer = csv.writer(tmp_out)
-        writer.writerow(columns)
-        for row in df.itertuples(index=False, name=None):
-            # convert NaN/NaT to empty
-            row_fixed = [("" if (pd.isna(v) or v is pd.NaT) else v) for v in row]
-            writer.writerow(row_fixed)
-        tmp_out.close()
-
-        # open a raw psycopg2 connection for DDL + COPY
-        conn = get_raw_psycopg_conn()
+def _encode(table_name: str, columns: List[str], types_map: Dict[str, str], profiler: ColumnProfiler,
+            progress: Callable[[str, int], None]) -> Dict[str, str]:
+    """Dictionary-encode the low-cardinality TEXT columns; a failure leaves the plain table in place."""
+    exact = {col: not truncated for col, truncated in profiler.truncated.items()}
+    candidates = encoding_candidates(types_map, profiler.distinct_counts(), exact, profiler.row_count)
+    if not candidates:
+        return {}
+    progress("encoding", profiler.row_count)
+    with ingest_connection() as conn:
         try:
-            # create table with inferred types (drop if exists)
-            create_table_with_types(conn, table_name, columns, types_map)
+            dims = encode_table(conn, table_name, columns, candidates)
+            print(f"[info] Dictionary-encoded {table_name}: {', '.join(dims)}")
+            return dims
+        except Exception as e:
+            conn.rollback()
+            print(f"[warn] Dictionary encoding failed for {table_name}, keeping plain table: {e}")
+            return {}
 
-            # COPY CSV into table (reuse your existing function)
-            rows_loaded = copy_csv_into_table(conn, tmp_out_path, table_name, columns)
-        finally:
-            conn.close()
+def widen_table_columns(conn, table_names: List[str], chunk: pd.DataFrame, types_map: Dict[str, str],
+                        profiler: Optional[ColumnProfiler] = None, fixed: Optional[set] = None):
+    """
+    Re-check a raw chunk against the column types chosen so far and ALTER the
+    columns of `table_names` to the merged type where its values no longer fit
+    (e.g. SMALLINT -> BIGINT, DATE -> TIMESTAMP, anything -> TEXT).
+    Updates `types_map` (and the profiler) in place. Columns in `fixed` and
+    TEXT columns are never re-checked.
+    """
+    changes = {}
+    for col, col_type in types_map.items():
+        if col_type == "TEXT" or (fixed and col in fixed):
+            continue
+        merged = merge_sql_types(col_type, chunk_sql_type(chunk[col]))
+        if merged != col_type:
+            changes[col] = merged
+    if not changes:
+        return
+    print(f"[info] Widening columns of {table_names[-1]}: "
+          + ", ".join(f"{c} {types_map[c]} -> {t}" for c, t in changes.items()))
+    alter_column_types(conn, table_names, changes)
+    for col, col_type in changes.items():
+        types_map[col] = col_type
+        if profiler:
+            profiler.retype(col, col_type)
 
-        # Update master_data_repository with the new table entry
-        conn = get_raw_psycopg_conn()
-        try:
-            with conn.cursor() as cur:
-                # First ensure the master_data_repository table exists
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS master_data_repository (
-                        file_name VARCHAR(255) PRIMARY KEY,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        row_count INTEGER
-                    )
-                """)
-                
-                # Simple insert since we handle existing entries earlier
-                cur.execute("""
-                    INSERT INTO master_data_repository (file_name, row_count, created_at)
-                    VALUES (%s, %s, CURRENT_TIMESTAMP)
-                """, (table_name, rows_loaded))
-                conn.commit()
-        finally:
-            conn.close()
-
-        return {"table_name": table_name, "rows_loaded": int(rows_loaded)}
-
-    finally:
-        # cleanup temp files
-        try:
-            if tmp_in:
-                os.unlink(tmp_in.name)
-        except Exception:
-            pass
+def _reject_unfit_columns(table_name: str, chunk: pd.DataFrame, types_map: Dict[str, str], fixed: set):
+    """400 if values of a column that cannot be ALTERed do not fit its type (COPY would fail or NULL them)."""
+    for col in fixed:
+        if types_map[col] == "TEXT":
+            continue
+        needed = merge_sql_types(types_map[col], chunk_sql_type(chunk[col]))
+        if needed != types_map[col]:
+            raise HTTPException(status_code=400, detail=(
+                f"Column '{col}' of '{table_name}' is {types_map[col]} and cannot be widened; "
+                f"the uploaded values need {needed}"))
+
+def _load_chunks(chunks: Iterator[pd.DataFrame], table_name: str, content_hash: Optional[str],
+                 progress: Callable[[str, int], None], schema_types: Optional[Dict[str, str]] = None,
+                 partition: bool = False, sheet_index: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Create `table_name` from `chunks` and register it in master_data_repository.
+    Columns named in `schema_types` use that type instead of being inferred.
+    With `partition` the table is range-partitioned on its TIMESTAMP/DATE column, if it has one.
+    `sheet_index` is the sheet's position when the table is one sheet of a workbook.
+    """
+    schema_types = schema_types or {}
+    first_chunk = next(chunks, None)
+    if first_chunk is None or first_chunk.shape[1] == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file has no columns")
+
+    orig_cols = list(first_chunk.columns)
+    columns = unique_column_names(orig_cols)  # you already have this function
+
+    # infer types for each column without a declared type from the leading chunk
+    types_map = {}
+    for col, orig in zip(columns, orig_cols):
+        if orig in schema_types:
+            types_map[col] = schema_types[orig]
+            continue
         try:
-            if 'tmp_out_path' in locals() and tmp_out_path.exists():
-                os.unlink(tmp_out_path)
+            types_map[col] = infer_sql_type(first_chunk[orig])
         except Exception:
-            pass
+            types_map[col] = "TEXT"
+
+    declared = {col for col, orig in zip(columns, orig_cols) if orig in schema_types}
+    partition_col = choose_partition_column(types_map, first_chunk.set_axis(columns, axis=1)) if partition else None
+
+    # one pooled connection for DDL + streamed COPY
+    with ingest_connection() as conn:
+        # create table with inferred types (drop if exists)
+        create_table_with_types(conn, table_name, columns, types_map, partition_by=partition_col)
+        periods = set()
+        if partition_col:
+            print(f"[info] Partitioning {table_name} by {PARTITION_GRANULARITY} on {partition_col}")
+            create_default_partition(conn, table_name)
+            declared.add(partition_col)  # a partition key cannot be ALTERed
+
+        # normalize each chunk (e.g. TIMESTAMP -> 'YYYY-MM-DD HH:MM:SS') and COPY it
+        rows_loaded = 0
+        profiler = ColumnProfiler(columns, types_map)
+        for i, chunk in enumerate(itertools.chain([first_chunk], chunks)):
+            chunk.columns = columns
+            if partition_col:
+                # a partition key value that does not parse would be NULLed into the default partition
+                _reject_unfit_columns(table_name, chunk, types_map, {partition_col})
+            if i:
+                # the types were inferred from the first chunk; widen if this one does not fit
+                widen_table_columns(conn, [table_name], chunk, types_map, profiler, fixed=declared)
+            chunk = normalize_chunk(chunk, types_map)
+            if partition_col:
+                ensure_partitions(conn, table_name, chunk[partition_col], periods, PARTITION_GRANULARITY)
+            profiler.update(chunk)
+            rows_loaded += copy_chunk_into_table(conn, chunk, table_name, columns)
+            progress("loading", rows_loaded)
+        conn.commit()
+
+    # encoding rewrites the table into a plain base table, so partitioned tables are left as they are
+    dims = {}
+    if INGEST_DICTIONARY_ENCODING and not partition_col:
+        dims = _encode(table_name, columns, types_map, profiler, progress)
+    optimization = _optimize(table_name, types_map, rows_loaded, profiler.distinct_counts(), progress, dims)
+
+    # Update master_data_repository with the new table entry
+    progress("registering", rows_loaded)
+    with ingest_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_master_repository(cur)
+            # replaces any entry left by an earlier upload under the same name
+            register_dataset(cur, table_name, rows_loaded, content_hash, sheet_index)
+            ensure_column_profiles(cur)
+            save_column_profiles(cur, table_name, profiler.profiles())
+            conn.commit()
+
+    return {"table_name": table_name, "rows_loaded": int(rows_loaded),
+            "encoded_columns": list(dims) or None, "partitioned_by": partition_col,
+            "optimization": optimization}
+
+def _load_sheet(path: str, sheet_name: str, sheet_index: int, table_name: str, content_hash: Optional[str]) -> Dict[str, Any]:
+    """Sheet worker-process entry point: load one worksheet into its own table."""
+    try:
+        result = _load_chunks(iter_sheet_chunks(path, sheet_name), table_name, content_hash, lambda stage, rows: None,
+                              sheet_index=sheet_index)
+    except HTTPException as e:
+        # e.g. a blank sheet; the other sheets still load
+        return {"sheet_name": sheet_name, "table_name": None, "rows_loaded": 0, "skipped": str(e.detail)}
+    return {"sheet_name": sheet_name, **result}
+
+def _load_workbook_sheets(path: Path, filename: str, sheets: List[str], content_hash: Optional[str],
+                          progress: Callable[[str, int], None]) -> Dict[str, Any]:
+    """
+    Load every sheet of a workbook into its own Data_Set_ table, parsing the
+    sheets in parallel worker processes (up to XLSX_SHEET_WORKERS).
+    The first loaded sheet's table is reported as the upload's table_name.
+    """
+    table_names = sheet_table_names(filename, sheets)
+
+    # create the catalog tables up front so concurrent sheet loads do not race on the DDL
+    with ingest_connection() as conn:
+        with conn.cursor() as cur:
+            ensure_master_repository(cur)
+            ensure_column_profiles(cur)
+        conn.commit()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    rows_done = 0
+    workers = max(1, min(len(sheets), XLSX_SHEET_WORKERS))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(_load_sheet, str(path), sheet, i, table_names[sheet], content_hash): sheet
+            for i, sheet in enumerate(sheets)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            rows_done += result["rows_loaded"]
+            progress("loading", rows_done)
+
+    sheet_results = [results[sheet] for sheet in sheets]
+    loaded = [r for r in sheet_results if r["table_name"]]
+    if not loaded:
+        raise HTTPException(status_code=400, detail="Uploaded workbook has no sheets with columns")
+    return {
+        "table_name": loaded[0]["table_name"],
+        "rows_loaded": int(rows_done),
+        "sheets": sheet_results,
+        "optimization": loaded[0].get("optimization"),
+    }
+
+def _append_chunks(fileobj: BinaryIO, ext: str, table_name: str, key_column: Optional[str],
+                   progress: Callable[[str, int], None]) -> Dict[str, Any]:
+    """
+    Append the chunks of `fileobj` to the existing `table_name`. The file's
+    (normalized) columns must match the table's. Without a key the rows are
+    COPYed straight in; with `key_column` they are staged and upserted.
+    The repository row count and the column profiles are updated
+    incrementally rather than recomputed from the table.
+    """
+    with ingest_connection() as conn:
+        table_columns = get_table_columns(conn, table_name)
+        if not table_columns:
+            raise HTTPException(status_code=404, detail=f"No dataset named '{table_name}' to append to")
+        with conn.cursor() as cur:
+            profiles = load_column_profiles(cur, table_name)
+
+        # prefer the ingest type names recorded in the profile over information_schema's
+        types_map = {col: sql_type_from_pg(dtype) for col, dtype in table_columns.items()}
+        types_map.update({p["column_name"]: p["data_type"] for p in profiles})
+
+        chunks = iter_upload_chunks(fileobj, ext)
+        first_chunk = next(chunks, None)
+        if first_chunk is None or first_chunk.shape[1] == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file has no columns")
+        columns = unique_column_names(list(first_chunk.columns))
+
+        missing = [c for c in table_columns if c not in columns]
+        extra = [c for c in columns if c not in table_columns]
+        if missing or extra:
+            raise HTTPException(status_code=400, detail=(
+                f"Columns do not match '{table_name}': missing {missing or 'none'}, unexpected {extra or 'none'}"))
+        if key_column and key_column not in table_columns:
+            raise HTTPException(status_code=400, detail=f"Key column '{key_column}' is not a column of '{table_name}'")
+        dims = encoded_columns(conn, table_name)
+        if dims and key_column:
+            raise HTTPException(status_code=400, detail=f"'{table_name}' is dictionary-encoded; upsert is not supported, append without a key")
+
+        file_types = {col: types_map[col] for col in columns}
+        profiler = ColumnProfiler.resume(profiles, types_map) if profiles else None
+        # encoded datasets are a view: rows are staged and encoded into the base table
+        target = create_staging_table(conn, table_name) if key_column or dims else table_name
+
+        # every chunk (text or columnar) is checked against the table's types and widens
+        # them where its values do not fit, e.g. Parquet int64 values into a SMALLINT column.
+        # The view pins an encoded dataset's column types, so those are never widened,
+        # and neither is the key of a partitioned one.
+        fixed = set(columns) if dims else set()
+        partitioning = partitioning_of(conn, table_name)
+        if partitioning:
+            fixed.add(partitioning[0])
+        tables = [target, table_name] if key_column else [table_name]
+        rows_loaded = 0
+        for chunk in itertools.chain([first_chunk], chunks):
+            chunk.columns = columns
+            _reject_unfit_columns(table_name, chunk, file_types, fixed)
+            widen_table_columns(conn, tables, chunk, file_types, profiler, fixed=fixed)
+            types_map.update(file_types)
+            chunk = normalize_chunk(chunk, file_types)
+            if partitioning:
+                partition_col, granularity, periods = partitioning
+                ensure_partitions(conn, table_name, chunk[partition_col], periods, granularity)
+            if profiler:
+                profiler.update(chunk)
+            rows_loaded += copy_chunk_into_table(conn, chunk, target, columns)
+            progress("loading", rows_loaded)
+
+        rows_updated = 0
+        rows_inserted = rows_loaded
+        if key_column:
+            progress("merging", rows_loaded)
+            rows_inserted, rows_updated = merge_staging_into_table(conn, target, table_name, columns, key_column)
+        elif dims:
+            rows_inserted = append_encoded(conn, target, table_name, columns, dims)
+
+        progress("registering", rows_loaded)
+        with conn.cursor() as cur:
+            ensure_master_repository(cur)
+            total_rows = record_append(cur, table_name, rows_inserted)
+            if profiler:
+                # upserted rows are counted as new values; the stats drift slightly until the next full ingest
+                profiler.row_count = total_rows
+                save_column_profiles(cur, table_name, profiler.profiles())
+        conn.commit()
+
+    optimization = _optimize(table_name, types_map, total_rows,
+                             profiler.distinct_counts() if profiler else None, progress, dims)
+
+    return {
+        "table_name": table_name,
+        "rows_loaded": int(rows_loaded),
+        "mode": "append",
+        "rows_inserted": int(rows_inserted),
+        "rows_updated": int(rows_updated),
+        "total_rows": int(total_rows),
+        "optimization": optimization,
+    }
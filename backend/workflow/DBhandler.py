@@ -1,20 +1,249 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Any
-import os
-from core.config import DATABASE_URL
+from psycopg import sql
+from psycopg.rows import dict_row
+from typing import List, Any, Dict, Optional, Tuple
+from core.cache import LRUCache
+from core.config import (SCHEMA_CACHE_ENTRIES, SCHEMA_CACHE_TTL_SECONDS, RESULT_CACHE_ENTRIES,
+                         RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS, MAX_ROWS_SERVER,
+                         MAX_RESULT_BYTES, QUERY_FETCH_ROWS, QUERY_STATEMENT_TIMEOUT_MS, QUERY_MAX_COST)
+from core.db_pool import async_pooled_connection
+from core.catalog import aget_dataset_version, aload_column_profiles, atouch_dataset
+from core.encoding import dim_table_name
+from workflow.NounIndex import NounIndex, rank_values, trigrams
+import asyncio
+import json
+import re
 
+SCHEMA_SAMPLE_VALUES = 5  # frequent values shown per text column in the schema
+
+# schemas and profiles per (table, dataset version); a re-ingest or append bumps the version
+_schema_cache = LRUCache(SCHEMA_CACHE_ENTRIES, SCHEMA_CACHE_TTL_SECONDS)
+# query results per (table, dataset version, normalized SQL), bounded by their estimated size
+_result_cache = LRUCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_TTL_SECONDS, max_bytes=RESULT_CACHE_MAX_BYTES)
+
+# literals: '...', "...", and dollar quotes $$...$$ / $tag$...$tag$
+_SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=tag)\$)"""
+                         r"""|(--[^\n]*|/\*.*?\*/)|(\s+)""", re.S)
+_WRITE_KEYWORDS = re.compile(r"\b(insert|update|delete|merge|truncate|alter|drop|create|grant|copy|call)\b")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Cache key form of a query: comments dropped, whitespace collapsed and
+    unquoted text lower-cased (PostgreSQL folds it anyway), literals and
+    quoted identifiers untouched, trailing semicolons removed.
+    """
+    parts = []
+    last = 0
+    for m in _SQL_TOKENS.finditer(query):
+        parts.append(query[last:m.start()].lower())
+        parts.append(m.group(1) or " ")  # keep literals, blank out comments and whitespace runs
+        last = m.end()
+    parts.append(query[last:].lower())
+    return re.sub(r" +", " ", "".join(parts)).strip().rstrip(";").strip()
+
+
+def _is_read_only(normalized: str) -> bool:
+    unquoted = _SQL_TOKENS.sub(" ", normalized)
+    return unquoted.lstrip().startswith(("select", "with")) and not _WRITE_KEYWORDS.search(unquoted)
+
+
+def is_read_only_query(query: str) -> bool:
+    """Whether a query is a single SELECT / WITH statement with no writing keyword."""
+    return _is_read_only(normalize_sql(query))
+
+
+def _quoted_identifiers(query: str) -> List[str]:
+    return [m.group(1)[1:-1].replace('""', '"') for m in _SQL_TOKENS.finditer(query)
+            if m.group(1) and m.group(1).startswith('"')]
+
+
+def _estimated_size(rows: List[Dict[str, Any]]) -> int:
+    """Rough in-memory footprint of fetched rows, for the result cache budget."""
+    return sum(64 + sum(48 + len(str(value)) for value in row.values()) for row in rows)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {"schema": _schema_cache.stats(), "results": _result_cache.stats()}
 
 
 class DBHandler:
-    def __init__(self):
-        self.conn = psycopg2.connect(DATABASE_URL)
+    """
+    Query-path database access (async, psycopg 3); every call checks a
+    connection out of the shared async pool, so it never blocks the event loop.
+    """
+
+    async def get_dataset_version(self, table_name: str) -> Optional[str]:
+        """Current ingest version of a dataset (None if it has no repository entry)."""
+        try:
+            async with async_pooled_connection() as conn, conn.cursor() as cur:
+                return await aget_dataset_version(cur, table_name)
+        except Exception as e:
+            print(f"Failed reading dataset version for {table_name}: {str(e)}")
+            return None
+
+    async def get_column_profiles(self, table_name: str) -> List[Dict[str, Any]]:
+        """Ingest-time column profiles for a table (empty if it was never profiled); cached per dataset version."""
+        try:
+            async with async_pooled_connection() as conn, conn.cursor() as cur:
+                key = ("profiles", table_name, await aget_dataset_version(cur, table_name))
+                profiles = _schema_cache.get(key)
+                if profiles is None:
+                    profiles = await aload_column_profiles(cur, table_name)
+                    _schema_cache.put(key, profiles)
+                return profiles
+        except Exception as e:
+            print(f"Failed loading column profiles for {table_name}: {str(e)}")
+            return []
+
+    async def get_column_names(self, table_name: str) -> List[str]:
+        """Column names of a table or encoded view; cached per dataset version."""
+        async with async_pooled_connection() as conn, conn.cursor() as cur:
+            key = ("columns", table_name, await aget_dataset_version(cur, table_name))
+            columns = _schema_cache.get(key)
+            if columns is None:
+                await cur.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_schema = 'public' AND table_name = %s
+                    ORDER BY ordinal_position
+                """, (table_name,))
+                columns = [name for (name,) in await cur.fetchall()]
+                _schema_cache.put(key, columns)
+            return columns
 
-    def get_schema(self, table_name: str) -> str:
-        """Retrieve the schema (columns & types) for a specific table."""
+    async def validate_query(self, table_name: str, query: str) -> Optional[str]:
+        """
+        Deterministic check of a generated query: one read-only statement, no
+        MySQL backticks, and a plan from EXPLAIN, which resolves every name and
+        type without running anything. Returns the problem found, or None;
+        name errors come with the columns the query probably meant.
+        """
+        normalized = normalize_sql(query)
+        unquoted = _SQL_TOKENS.sub(" ", normalized)
+        if not normalized:
+            return "The query is empty."
+        if ";" in unquoted:
+            return "Only a single SQL statement can be run."
+        if "`" in unquoted:
+            return "Backticks are not valid identifier quotes in PostgreSQL; use double quotes."
+        if not _is_read_only(normalized):
+            return "Only read-only SELECT queries can be run."
+        try:
+            await self.explain_query(query)
+            return None
+        except Exception as e:
+            problem = str(e).strip()
         try:
-            with self.conn.cursor() as cur:
-                cur.execute("""
+            columns = await self.get_column_names(table_name)
+        except Exception:
+            return problem
+
+        # quoted names in the wrong case, and mixed-case columns left unquoted (Postgres folds them)
+        by_lower = {col.lower(): col for col in columns}
+        words = set(re.findall(r"\w+", unquoted))
+        hints = [f'"{name}" should be "{by_lower[name.lower()]}"'
+                 for name in dict.fromkeys(_quoted_identifiers(query))
+                 if name not in columns and name.lower() in by_lower]
+        hints += [f'{col.lower()} should be quoted as "{col}"' for col in columns
+                  if col != col.lower() and col.lower() in words]
+        return "; ".join([problem] + hints)
+
+    async def get_noun_index(self, table_name: str) -> NounIndex:
+        """Trigram index over the profiled values of the dataset's text columns; cached per dataset version."""
+        key = ("nouns", table_name, await self.get_dataset_version(table_name))
+        index = _schema_cache.get(key)
+        if index is None:
+            index = NounIndex(await self.get_column_profiles(table_name))
+            _schema_cache.put(key, index)
+        return index
+
+    async def search_column_values(self, table_name: str, column: str, terms: List[str], limit: int) -> List[str]:
+        """
+        Up to `limit` distinct values of a text column matching any of `terms`
+        by pg_trgm word similarity, best first. An encoded column is searched
+        in its (small) dimension table; a plain column only when it has a
+        pg_trgm GIN index, otherwise the match would scan the whole dataset on
+        every question and the column is skipped (empty result). Datasets
+        ingested without NOUN_TRIGRAM_INDEXES / INGEST_OPTIMIZE, or without
+        pg_trgm installed, have no such index.
+        """
+        if not terms:
+            return []
+        try:
+            async with async_pooled_connection() as conn, conn.cursor() as cur:
+                dim = dim_table_name(table_name, column)
+                await cur.execute("SELECT to_regclass(format('%%I', %s)) IS NOT NULL", (dim,))
+                relation, col = ((dim, "value") if (await cur.fetchone())[0] else (table_name, column))
+                if relation == table_name:
+                    await cur.execute("""
+                        SELECT EXISTS (
+                            SELECT 1
+                            FROM pg_index i
+                            JOIN pg_opclass oc ON oc.oid = i.indclass[0]
+                            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                            WHERE i.indrelid = to_regclass(format('%%I', %s))
+                              AND a.attname = %s
+                              AND oc.opcname = 'gin_trgm_ops'
+                        )
+                    """, (table_name, column))
+                    if not (await cur.fetchone())[0]:
+                        print(f"[info] No trigram index on {table_name}.{column}, skipping value search")
+                        return []
+                await cur.execute(sql.SQL("""
+                    SELECT DISTINCT {col} FROM {relation} WHERE {match} LIMIT {candidates}
+                """).format(
+                    col=sql.Identifier(col),
+                    relation=sql.Identifier(relation),
+                    match=sql.SQL(" OR ").join(sql.SQL("{} <% {}").format(sql.Literal(term), sql.Identifier(col))
+                                               for term in terms),
+                    candidates=sql.Literal(limit * 20),
+                ))
+                values = [str(value) for (value,) in await cur.fetchall()]
+        except Exception as e:
+            print(f"Failed searching values of {table_name}.{column}: {str(e)}")
+            return []
+        return [value for _, value in rank_values(values, [trigrams(term) for term in terms])[:limit]]
+
+    @staticmethod
+    def _describe_column(table_name: str, profile: Dict[str, Any]) -> str:
+        line = f"{table_name}: {profile['column_name']} ({profile['data_type'].lower()})"
+        hints = []
+        row_count = profile["row_count"] or 0
+        if row_count:
+            hints.append(f"{profile['null_count'] * 100.0 / row_count:.1f}% null")
+        distinct = profile["distinct_count"]
+        hints.append(f"{distinct} distinct" if profile["distinct_is_exact"] else f"over {distinct} distinct")
+        if profile["data_type"] == "TEXT":
+            samples = [value for value, _ in (profile["top_values"] or [])[:SCHEMA_SAMPLE_VALUES]]
+            if samples:
+                hints.append("e.g. " + ", ".join(repr(v) for v in samples))
+        elif profile["min_value"] is not None:
+            hints.append(f"range {profile['min_value']} to {profile['max_value']}")
+        return f"{line} -- {', '.join(hints)}"
+
+    async def get_schema(self, table_name: str) -> str:
+        """
+        Retrieve the schema (columns & types) for a specific table. Profiled
+        tables are described from the column_profiles catalog, including
+        cardinality, null ratio and ranges/frequent values.
+        Cached per dataset version, so the information_schema lookup runs once
+        per ingest rather than once per question.
+        """
+        key = ("schema", table_name, await self.get_dataset_version(table_name))
+        schema = _schema_cache.get(key)
+        if schema is None:
+            schema = await self._load_schema(table_name)
+            if not schema.startswith("No table found"):
+                _schema_cache.put(key, schema)
+        return schema
+
+    async def _load_schema(self, table_name: str) -> str:
+        profiles = await self.get_column_profiles(table_name)
+        if profiles:
+            return "\n".join(self._describe_column(table_name, p) for p in profiles)
+
+        try:
+            async with async_pooled_connection() as conn, conn.cursor() as cur:
+                await cur.execute("""
                     SELECT column_name, data_type
                     FROM information_schema.columns
                     WHERE table_schema = 'public'
@@ -22,7 +251,7 @@ class DBHandler:
                     ORDER BY ordinal_position;
                 """, (table_name,))
                 
-                rows = cur.fetchall()
+                rows = await cur.fetchall()
                 
                 if not rows:
                     return f"No table found with name '{table_name}'"
@@ -32,31 +261,130 @@ class DBHandler:
         except Exception as e:
             raise Exception(f"Error fetching schema for {table_name}: {str(e)}")
 
-    def execute_query(self, table_name: str, query: str, isParamertized: bool = True) -> List[Any]:
-        """Execute SQL query on the given table and return results."""
+    async def touch_dataset(self, table_name: str):
+        """Mark the dataset as recently used so the GC sweeper keeps it."""
+        try:
+            async with async_pooled_connection() as conn, conn.cursor() as cur:
+                await atouch_dataset(cur, table_name)
+        except Exception as e:
+            print(f"Failed recording query time for {table_name}: {str(e)}")
+
+    async def execute_cached_query(self, table_name: str, query: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Run a generated (non-parametrized) read-only query through the result
+        cache. Entries are keyed on the dataset version, so an append or
+        re-ingest invalidates them; tables without a repository entry and
+        writing statements are never cached.
+        """
+        normalized = normalize_sql(query)
+        version = await self.get_dataset_version(table_name) if _is_read_only(normalized) else None
+        if version is None:
+            return await self._execute_generated(table_name, query)
+        key = (table_name, version, normalized)
+        cached = _result_cache.get(key)
+        if cached is None:
+            cached = await self._execute_generated(table_name, query)
+            _result_cache.put(key, cached, size=_estimated_size(cached[0]))
+        else:
+            print(f"Result cache hit on {table_name}")
+        return cached
+
+    async def _execute_generated(self, table_name: str, query: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Guard an LLM-generated query, then run it read-only under the per-query statement_timeout."""
+        query = await self.guard_query(table_name, query)
+        return await self.execute_query(table_name, query, isParamertized=False,
+                                        statement_timeout_ms=QUERY_STATEMENT_TIMEOUT_MS, read_only=True)
+
+    async def explain_query(self, query: str) -> Dict[str, Any]:
+        """Planner estimate of a query's top plan node ("Total Cost", "Plan Rows", ...); nothing is executed."""
+        async with async_pooled_connection() as conn, conn.cursor() as cur:
+            await cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+            plan = (await cur.fetchone())[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]["Plan"]
+
+    async def guard_query(self, table_name: str, query: str) -> str:
+        """
+        EXPLAIN a generated read-only query before it runs. A plan expected to
+        return more than MAX_ROWS_SERVER rows is wrapped in a LIMIT (execution
+        stops there anyway, and the planner can then pick a fast-start plan);
+        a plan still costing more than QUERY_MAX_COST is rejected, and so is
+        any statement that is not read-only.
+        """
+        if not _is_read_only(normalize_sql(query)):
+            print(f"[warn] Rejected non read-only query on {table_name}")
+            raise Exception(f"Query on {table_name} rejected: only read-only SELECT queries can be run")
+        try:
+            plan = await self.explain_query(query)
+            if plan["Plan Rows"] > MAX_ROWS_SERVER:
+                body = query.strip().rstrip(";")
+                # newlines keep a trailing line comment in the body from swallowing the wrapper
+                query = f"SELECT * FROM (\n{body}\n) AS bounded LIMIT {MAX_ROWS_SERVER + 1}"
+                plan = await self.explain_query(query)
+                print(f"[info] Query on {table_name} estimated at {plan['Plan Rows']} rows, added LIMIT")
+        except Exception as e:
+            print(f"Failed explaining query on {table_name}: {str(e)}")
+            raise Exception(f"Error executing query on {table_name}: {str(e)}")
+        if QUERY_MAX_COST and plan["Total Cost"] > QUERY_MAX_COST:
+            print(f"[warn] Rejected query on {table_name}: estimated cost {plan['Total Cost']:.0f}")
+            raise Exception(f"Query on {table_name} rejected: estimated cost {plan['Total Cost']:.0f} "
+                            f"exceeds the limit of {QUERY_MAX_COST:.0f}; try a narrower question")
+        return query
+
+    async def execute_query(self, table_name: str, query: str, isParamertized: bool = True,
+                            max_rows: int = MAX_ROWS_SERVER,
+                            max_bytes: int = MAX_RESULT_BYTES,
+                            statement_timeout_ms: Optional[int] = None,
+                            read_only: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Execute SQL query on the given table and return (rows, truncated).
+        Read-only queries stream through a server-side cursor in batches of
+        QUERY_FETCH_ROWS and stop at `max_rows` rows or `max_bytes` (estimated),
+        so a broad SELECT is never fully materialized in the API process.
+        If the calling task is cancelled (client disconnect, timeout) the
+        running statement is cancelled on the server too. With `read_only`
+        the statement runs in a READ ONLY transaction, so the server refuses
+        any write it attempts.
+        """
         try:
 
             print(f"Executing query on {table_name}: {query}")
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if isParamertized:
                 # Ensure table_name is safely injected (avoid SQL injection by quoting)
-                from psycopg2 import sql
-                formatted_query = sql.SQL(query).format(
-                    table=sql.Identifier(table_name)
-                )
-                if isParamertized:
-                    cur.execute(formatted_query)
-                else:
-                    print("Executing non-parametrized query")
-                    cur.execute(query)
-                    print("After executing non-parametrized query")
-                
-                print(f"Query executed successfully on {table_name}")
-                
-                if cur.description:  # SELECT
-                    return cur.fetchall()
-                else:  # INSERT / UPDATE / DELETE
-                    return []
+                statement = sql.SQL(query).format(table=sql.Identifier(table_name))
+            else:
+                print("Executing non-parametrized query")
+                statement = query
+            # DECLARE only accepts SELECT/VALUES; anything else runs on a client-side cursor
+            name = "bounded_query" if _is_read_only(normalize_sql(query)) else None
+            async with async_pooled_connection(statement_timeout_ms) as conn:
+                if read_only:
+                    await conn.execute("SET TRANSACTION READ ONLY")
+                try:
+                    async with conn.cursor(name, row_factory=dict_row) as cur:
+                        await cur.execute(statement)
+                        print(f"Query executed successfully on {table_name}")
+
+                        if not cur.description:  # INSERT / UPDATE / DELETE
+                            return [], False
+                        rows: List[Dict[str, Any]] = []
+                        size = 0
+                        while True:
+                            # one row past the budget tells a full result from a truncated one
+                            batch = await cur.fetchmany(min(QUERY_FETCH_ROWS, max_rows + 1 - len(rows)))
+                            if not batch:
+                                return rows, False
+                            for row in batch:
+                                size += _estimated_size([row])
+                                if len(rows) >= max_rows or (max_bytes and size > max_bytes):
+                                    print(f"[info] Result on {table_name} truncated at {len(rows)} rows")
+                                    return rows, True
+                                rows.append(row)
+                except asyncio.CancelledError:
+                    # stop the backend instead of letting it finish a query nobody waits for
+                    await conn.cancel_safe()
+                    raise
         except Exception as e:
-            self.conn.rollback()
             print(f"Failed executing query on {table_name}: {str(e)}")
             raise Exception(f"Error executing query on {table_name}: {str(e)}")
@@ -1,45 +1,47 @@
 import json
 from langchain_core.prompts import ChatPromptTemplate
-from workflow.LLMconfig import LLMManager
+from workflow.LLMconfig import get_llm_manager, LLMParseError
+from workflow.result_summary import results_for_prompt
 from workflow.graph_type_instruction import graph_type_instructions
 
 
 class DataProcessor:
     def __init__(self):
-        self.llm_manager = LLMManager()
+        self.llm_manager = get_llm_manager()
 
     
-    def format_data_for_visualization(self, state: dict) -> dict:
+    async def format_data_for_visualization(self, state: dict) -> dict:
         """Format the data for the chosen visualization type."""
-        visualization = state['visualization'].strip()
-        results = state['results']
+        visualization = (state.get('visualization') or "none").strip()
+        results = state.get('results')
         user_query = state['user_query']
         sql_query = state['sql_query']
 
-        if visualization == "none":
+        # execute_sql returns only {"error": ...} when the query was refused or timed out
+        if state.get('error') or visualization == "none":
             return {"formatted_data_for_visualization": None}
         
         if visualization == "scatter":
             try:
                 return self._format_scatter_data(results)
             except Exception as e:
-                return self._format_other_visualizations(visualization, user_query, sql_query, results)
+                return await self._format_other_visualizations(visualization, user_query, sql_query, results_for_prompt(state))
         
         if visualization == "bar" or visualization == "horizontal_bar":
             try:
-                return self._format_bar_data(results, user_query)
+                return await self._format_bar_data(results, user_query)
             except Exception as e:
-                return self._format_other_visualizations(visualization, user_query, sql_query, results)
+                return await self._format_other_visualizations(visualization, user_query, sql_query, results_for_prompt(state))
         
         if visualization == "line":
             try:
-                return self._format_line_data(results, user_query)
+                return await self._format_line_data(results, user_query)
             except Exception as e:
-                return self._format_other_visualizations(visualization, user_query, sql_query, results)
+                return await self._format_other_visualizations(visualization, user_query, sql_query, results_for_prompt(state))
         
-        return self._format_other_visualizations(visualization, user_query, sql_query, results)
+        return await self._format_other_visualizations(visualization, user_query, sql_query, results_for_prompt(state))
     
-    def _format_line_data(self, results, question):
+    async def _format_line_data(self, results, question):
         if isinstance(results, str):
             results = eval(results)
 
@@ -53,7 +55,7 @@ class DataProcessor:
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
                 ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures over time, the label could be 'Sales'. If the data is the population growth, the label could be 'Population'. If the data is the revenue trend, the label could be 'Revenue'."),
             ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            label = await self.llm_manager.ainvoke(prompt, question=question, data=str(results[:2]))
 
             formatted_data = {
                 "xValues": x_values,
@@ -119,7 +121,7 @@ class DataProcessor:
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the y-axis."),
                 ("human", "Question: {question}\n Data (first few rows): {data}\n\nProvide a concise label for the y-axis. For example, if the data represents sales figures over time for different categories, the label could be 'Sales'. If it's about population growth for different groups, it could be 'Population'."),
             ])
-            y_axis_label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            y_axis_label = await self.llm_manager.ainvoke(prompt, question=question, data=str(results[:2]))
 
             # Add the y-axis label to the formatted data
             formatted_data["yAxisLabel"] = y_axis_label.strip()
@@ -163,7 +165,7 @@ class DataProcessor:
         return {"formatted_data_for_visualization": formatted_data}
 
 
-    def _format_bar_data(self, results, question):
+    async def _format_bar_data(self, results, question):
         if isinstance(results, str):
             results = eval(results)
 
@@ -177,7 +179,7 @@ class DataProcessor:
                 ("system", "You are a data labeling expert. Given a question and some data, provide a concise and relevant label for the data series."),
                 ("human", "Question: {question}\nData (first few rows): {data}\n\nProvide a concise label for this y axis. For example, if the data is the sales figures for products, the label could be 'Sales'. If the data is the population of cities, the label could be 'Population'. If the data is the revenue by region, the label could be 'Revenue'."),
             ])
-            label = self.llm_manager.invoke(prompt, question=question, data=str(results[:2]))
+            label = await self.llm_manager.ainvoke(prompt, question=question, data=str(results[:2]))
             
             values = [{"data": data, "label": label}]
         elif len(results[0]) == 3:
@@ -199,16 +201,15 @@ class DataProcessor:
 
         return {"formatted_data_for_visualization": formatted_data}
 
-    def _format_other_visualizations(self, visualization, question, sql_query, results):
+    async def _format_other_visualizations(self, visualization, question, sql_query, results):
         instructions = graph_type_instructions[visualization]
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are a Data expert who formats data according to the required needs. You are given the question asked by the user, it's sql query, the result of the query and the format you need to format it in."),
             ("human", 'For the given question: {question}\n\nSQL query: {sql_query}\n\Result: {results}\n\nUse the following example to structure the data: {instructions}. Just give the json string. Do not format it'),
         ])
-        response = self.llm_manager.invoke(prompt, question=question, sql_query=sql_query, results=results, instructions=instructions)
-            
         try:
-            formatted_data_for_visualization = json.loads(response)
+            formatted_data_for_visualization = await self.llm_manager.ainvoke_parsed(
+                prompt, json.loads, question=question, sql_query=sql_query, results=results, instructions=instructions)
             return {"formatted_data_for_visualization": formatted_data_for_visualization}
-        except json.JSONDecodeError:
-            return {"error": "Failed to format data for visualization", "raw_response": response}
\ No newline at end of file
+        except LLMParseError as e:
+            return {"error": "Failed to format data for visualization", "raw_response": e.response}
\ No newline at end of file
@@ -1,11 +1,124 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_deepseek import ChatDeepSeek
+from typing import Any, Callable, Dict, List, Optional
+from core.cache import LRUCache, SQLiteCache
+from core.config import (LLM_CACHE_ENABLED, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DISK_ENTRIES,
+                         LLM_CACHE_TTL_SECONDS, LLM_CACHE_PATH)
+import asyncio
+import hashlib
+import json
+
+MODEL_NAME = "deepseek-chat"
+TEMPERATURE = 0
+
+
+class LLMParseError(ValueError):
+    """A response the caller's parser rejected; `response` holds the raw text."""
+
+    def __init__(self, response: str, error: Exception):
+        super().__init__(f"Could not parse LLM response: {error}")
+        self.response = response
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache of LLM responses: an in-memory LRU in front of a SQLite
+    file, so answers survive restarts and are shared by the workers on a host.
+    Keyed on a hash of the model, temperature and formatted messages.
+    """
+
+    def __init__(self):
+        self.memory = LRUCache(LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_TTL_SECONDS)
+        self.disk = SQLiteCache(LLM_CACHE_PATH, LLM_CACHE_DISK_ENTRIES, LLM_CACHE_TTL_SECONDS) if LLM_CACHE_PATH else None
+
+    @staticmethod
+    def key(model: str, temperature: float, messages: List[Any]) -> str:
+        payload = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "messages": [[m.type, m.content] for m in messages],
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        return value
+
+    def put(self, key: str, value: str):
+        self.memory.put(key, value)
+        if self.disk:
+            self.disk.put(key, value)
+
+    def discard(self, key: str):
+        self.memory.discard(key)
+        if self.disk:
+            self.disk.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"memory": self.memory.stats(), "disk": self.disk.stats() if self.disk else None}
+
 
 class LLMManager:
     def __init__(self):
-        self.llm = ChatDeepSeek(model="deepseek-chat", temperature=0)
+        self.llm = ChatDeepSeek(model=MODEL_NAME, temperature=TEMPERATURE)
+        # only deterministic (temperature 0) responses are safe to replay
+        self.cache = LLMResponseCache() if LLM_CACHE_ENABLED and TEMPERATURE == 0 else None
 
     def invoke(self, prompt: ChatPromptTemplate, **kwargs) -> str:
         messages = prompt.format_messages(**kwargs)
+        key = self.cache and LLMResponseCache.key(MODEL_NAME, TEMPERATURE, messages)
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         response = self.llm.invoke(messages)
-        return response.content
\ No newline at end of file
+        if key:
+            self.cache.put(key, response.content)
+        return response.content
+
+    async def ainvoke(self, prompt: ChatPromptTemplate, **kwargs) -> str:
+        """Async invoke; awaits the DeepSeek HTTP call instead of blocking the event loop."""
+        return await self.ainvoke_parsed(prompt, lambda response: response, **kwargs)
+
+    async def ainvoke_parsed(self, prompt: ChatPromptTemplate, parse: Callable[[str], Any], **kwargs) -> Any:
+        """
+        ainvoke for responses the caller parses (JSON, "Key: value" lines):
+        returns parse(response). A response is cached only once `parse`
+        accepted it, and a cached one it rejects is evicted and asked for
+        again, so a malformed answer is never replayed. Raises LLMParseError.
+        """
+        messages = prompt.format_messages(**kwargs)
+        key = self.cache and LLMResponseCache.key(MODEL_NAME, TEMPERATURE, messages)
+        if key:
+            # the disk tier is file I/O; keep it off the event loop
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                try:
+                    return parse(cached)
+                except Exception:
+                    await asyncio.to_thread(self.cache.discard, key)
+        response = (await self.llm.ainvoke(messages)).content
+        try:
+            parsed = parse(response)
+        except Exception as e:
+            raise LLMParseError(response, e) from e
+        if key:
+            await asyncio.to_thread(self.cache.put, key, response)
+        return parsed
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit/miss counters of the response cache (None when caching is off)."""
+        return self.cache.stats() if self.cache else None
+
+_llm_manager = None
+
+def get_llm_manager() -> LLMManager:
+    """Process-wide LLMManager, so all nodes share one DeepSeek client (and its HTTP connections)."""
+    global _llm_manager
+    if _llm_manager is None:
+        _llm_manager = LLMManager()
+    return _llm_manager
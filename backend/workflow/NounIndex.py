@@ -0,0 +1,82 @@
+from typing import Any, Dict, Iterable, List, Set, Tuple
+import re
+
+# ---------- Question-driven noun lookup ----------
+# get_unique_nouns used to put every distinct value of the noun columns into
+# the generate_sql prompt. Instead, the terms of the user question are matched
+# against column values by trigram word similarity (the measure of pg_trgm's
+# word_similarity / <% operator) and only the best NOUN_TOP_K values are kept.
+# Values listed in a column's ingest profile are matched here, in process;
+# columns with more distinct values than the profile keeps are searched in
+# Postgres through their trigram index (DBHandler.search_column_values), which
+# ingest builds only when NOUN_TRIGRAM_INDEXES is set; without one only the
+# profiled values are matched.
+
+WORD_SIMILARITY_THRESHOLD = 0.6  # pg_trgm.word_similarity_threshold default
+
+_STOPWORDS = {
+    "the", "and", "for", "with", "from", "that", "this", "what", "which", "who", "whom", "how", "many", "much",
+    "are", "was", "were", "has", "have", "had", "did", "does", "show", "list", "give", "get", "all",
+    "each", "per", "top", "total", "number", "count",
+    "average", "sum", "between", "than", "more", "less", "most", "least", "over", "under", "their", "there",
+}
+
+
+def question_terms(question: str) -> List[str]:
+    """Distinct words of the question worth matching against column values."""
+    terms = []
+    for word in re.findall(r"\w+", question.lower()):
+        if len(word) >= 3 and word not in _STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+def trigrams(text: str) -> Set[str]:
+    """pg_trgm style trigrams: lower-cased words padded with two leading spaces and one trailing."""
+    grams: Set[str] = set()
+    for word in re.findall(r"\w+", text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def match_score(term_grams: List[Set[str]], value_grams: Set[str]) -> float:
+    """
+    Sum over the question terms of the share of each term's trigrams found in
+    the value, counting only terms at or above WORD_SIMILARITY_THRESHOLD; a
+    value matching several terms ranks above one matching a single term.
+    """
+    score = 0.0
+    for grams in term_grams:
+        if grams:
+            similarity = len(grams & value_grams) / len(grams)
+            if similarity >= WORD_SIMILARITY_THRESHOLD:
+                score += similarity
+    return score
+
+def rank_values(values: Iterable[str], term_grams: List[Set[str]]) -> List[Tuple[float, str]]:
+    """(score, value) of the values matching at least one term, best first."""
+    scored = [(match_score(term_grams, trigrams(value)), value) for value in values]
+    return sorted(((s, v) for s, v in scored if s > 0), reverse=True)
+
+
+class NounIndex:
+    """Trigram sets of the profiled frequent values of one dataset version's text columns."""
+
+    def __init__(self, profiles: List[Dict[str, Any]]):
+        self.values: Dict[str, List[Tuple[str, Set[str]]]] = {}
+        self.complete: Set[str] = set()  # columns whose profile lists every distinct value
+        for p in profiles:
+            if p["data_type"] != "TEXT":
+                continue
+            col = p["column_name"]
+            top = [value for value, _ in (p["top_values"] or []) if value]
+            self.values[col] = [(value, trigrams(value)) for value in top]
+            if p["distinct_is_exact"] and p["distinct_count"] <= len(top):
+                self.complete.add(col)
+
+    def covers(self, column: str) -> bool:
+        """Whether matching the profiled values of `column` is as good as searching the table."""
+        return column in self.complete
+
+    def search(self, column: str, term_grams: List[Set[str]]) -> List[Tuple[float, str]]:
+        scored = [(match_score(term_grams, grams), value) for value, grams in self.values.get(column, [])]
+        return sorted(((s, v) for s, v in scored if s > 0), reverse=True)
@@ -1,49 +1,71 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from workflow.DBhandler import DBHandler
-from workflow.LLMconfig import LLMManager
+from workflow.DBhandler import DBHandler, is_read_only_query
+from workflow.LLMconfig import get_llm_manager
+from workflow.result_summary import summarize_results, results_for_prompt
+from workflow.NounIndex import question_terms, trigrams, rank_values
+from core.config import NOUN_TOP_K
 from workflow.prompts import parse_question_prompt, generate_sql_prompt, validate_and_fix_sql_prompt, select_visualization_prompt
 
+def _parse_visualization(response: str):
+    """("bar", "reason") from the "Recommended Visualization: ...\nReason: ..." reply."""
+    lines = response.strip().split('\n')
+    visualization = lines[0].split(': ')[1].strip()
+    reason = lines[1].split(': ')[1]
+    return visualization, reason
+
+
 class SQLAgent:
     def __init__(self):
         self.db_manager = DBHandler()
-        self.llm_manager = LLMManager()
+        self.llm_manager = get_llm_manager()
 
-    def understand_question(self, state: dict) -> dict:
+    async def understand_question(self, state: dict) -> dict:
         """Parse user question and identify relevant tables and columns."""
         question = state['user_query']
-        schema = self.db_manager.get_schema(state['table_id'])
+        schema = await self.db_manager.get_schema(state['table_id'])
 
         prompt = parse_question_prompt
 
         output_parser = JsonOutputParser()
         
-        response = self.llm_manager.invoke(prompt, schema=schema, question=question)
-        parsed_response = output_parser.parse(response)
-        return {"parsed_question": parsed_response}
+        parsed_response = await self.llm_manager.ainvoke_parsed(prompt, output_parser.parse, schema=schema, question=question)
+        return {"parsed_question": parsed_response, "schema": schema}
 
-    def get_unique_nouns(self, state: dict) -> dict:
+    async def get_unique_nouns(self, state: dict) -> dict:
         """Find unique nouns in relevant tables and columns."""
         parsed_question = state['parsed_question']
         
         if not parsed_question['is_relevant']:
             return {"unique_nouns": []}
 
-        unique_nouns = set()
+        # only values resembling words of the question, best matches first (see workflow/NounIndex.py)
+        terms = question_terms(state['user_query'])
+        if not terms:
+            return {"unique_nouns": []}
+        term_grams = [trigrams(term) for term in terms]
+        table_id = state['table_id']
+        index = await self.db_manager.get_noun_index(table_id)
+
+        scores = {}
         for table_info in parsed_question['relevant_tables']:
-            table_name = table_info['table_name']
-            noun_columns = table_info['noun_columns']
-            
-            if noun_columns:
-                column_names = ', '.join(f"{col}" for col in noun_columns)
-                query = f'SELECT DISTINCT {column_names} FROM "{table_name}"'
-                results = self.db_manager.execute_query(state['table_id'], query)
-                for row in results:
-                    unique_nouns.update(str(value) for value in row if value)
-
-        return {"unique_nouns": list(unique_nouns)}
-
-    def generate_sql(self, state: dict) -> dict:
+            for col in table_info['noun_columns'] or []:
+                matches = index.search(col, term_grams)
+                if not index.covers(col):
+                    # more distinct values than the profile keeps: ask the column's trigram index
+                    values = await self.db_manager.search_column_values(table_id, col, terms, NOUN_TOP_K)
+                    matches += rank_values(values, term_grams)
+                for score, value in matches:
+                    scores[value] = max(score, scores.get(value, 0.0))
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return {"unique_nouns": ranked[:NOUN_TOP_K]}
+
+    async def _schema(self, state: dict) -> str:
+        """The schema understand_question put in the state, fetched only if it is missing."""
+        return state.get('schema') or await self.db_manager.get_schema(state['table_id'])
+
+    async def generate_sql(self, state: dict) -> dict:
         """Generate SQL query based on parsed question and unique nouns."""
         user_query = state['user_query']
         parsed_question = state['parsed_question']
@@ -52,95 +74,111 @@ class SQLAgent:
         if not parsed_question['is_relevant']:
             return {"sql_query": "NOT_RELEVANT", "is_relevant": False}
     
-        schema = self.db_manager.get_schema(state['table_id'])
+        schema = await self._schema(state)
 
         prompt = generate_sql_prompt
 
-        response = self.llm_manager.invoke(prompt, schema=schema, user_query=user_query, parsed_question=parsed_question, unique_nouns=unique_nouns)
+        response = await self.llm_manager.ainvoke(prompt, schema=schema, user_query=user_query, parsed_question=parsed_question, unique_nouns=unique_nouns)
         
         if response.strip() == "NOT_ENOUGH_INFO":
             return {"sql_query": "NOT_RELEVANT"}
         else:
             return {"sql_query": response}
 
-    def validate_and_fix_sql(self, state: dict) -> dict:
+    async def validate_and_fix_sql(self, state: dict) -> dict:
         """Validate and fix the generated SQL query."""
         sql_query = state['sql_query']
 
         if sql_query == "NOT_RELEVANT":
             return {"sql_query": "NOT_RELEVANT", "sql_valid": False}
-        
-        schema = self.db_manager.get_schema(state['table_id'])
-
-        prompt = validate_and_fix_sql_prompt
 
         print("Validating SQL query...")
 
-        output_parser = JsonOutputParser()
-        
-        try:
-            response = self.llm_manager.invoke(prompt, schema=schema, sql_query=sql_query)
+        # checked locally against the database first; the LLM only fixes queries that fail
+        errors = await self.db_manager.validate_query(state['table_id'], sql_query)
+        if errors is None:
+            return {"sql_query": sql_query, "sql_valid": True}
+        print(f"SQL query failed validation: {errors}")
 
-            result = output_parser.parse(response)
+        schema = await self._schema(state)
 
+        prompt = validate_and_fix_sql_prompt
 
+        output_parser = JsonOutputParser()
 
-            if result["valid"] and result["issues"] is None:
-                return {"sql_query": sql_query, "sql_valid": True}
-            else:
-                return {
-                    "sql_query": result["corrected_query"],
-                    "sql_valid": result["valid"],
-                    "sql_issues": result["issues"]
-                }
+        def parse(response: str) -> dict:
+            result = output_parser.parse(response)
+            if not isinstance(result, dict) or "corrected_query" not in result:
+                raise ValueError("expected a JSON object with corrected_query")
+            return result
+
+        try:
+            result = await self.llm_manager.ainvoke_parsed(prompt, parse, schema=schema, sql_query=sql_query, errors=errors)
+
+            corrected = result["corrected_query"] or sql_query
+            remaining = await self.db_manager.validate_query(state['table_id'], corrected)
+            return {
+                "sql_query": corrected,
+                "sql_valid": remaining is None,
+                "sql_issues": remaining or result.get("issues")
+            }
         except Exception as e:
-            print(f"Error during SQL validation: {str(e)}") 
+            print(f"Error during SQL validation: {str(e)}")
+            return {"sql_query": sql_query, "sql_valid": False, "sql_issues": errors}
 
-    def execute_sql(self, state: dict) -> dict:
+    async def execute_sql(self, state: dict) -> dict:
         """Execute SQL query and return results."""
         query = state['sql_query']
         table_id = state['table_id']
         
         if query == "NOT_RELEVANT":
             return {"results": "NOT_RELEVANT"}
+        # generated SQL is never run unless it is a validated, read-only query
+        if state.get('sql_valid') is False:
+            return {"error": f"The generated query is not valid: {state.get('sql_issues') or 'unknown problem'}"}
+        if not is_read_only_query(query):
+            return {"error": "Only read-only SELECT queries can be run."}
 
         try:
-            results = self.db_manager.execute_query(table_id, query, isParamertized=False)
-            return {"results": results}
+            results, truncated = await self.db_manager.execute_cached_query(table_id, query)
+            await self.db_manager.touch_dataset(table_id)
+            return {"results": results, "truncated": truncated,
+                    "results_summary": summarize_results(results, truncated)}
         except Exception as e:
             return {"error": str(e)}
 
-    def format_results(self, state: dict) -> dict:
+    async def format_results(self, state: dict) -> dict:
         """Format query results into a human-readable response."""
         question = state['user_query']
-        results = state['results']
+        results = state.get('results')
 
         if results == "NOT_RELEVANT":
             return {"answer": "Sorry, I can only give answers relevant to the database."}
+        if state.get('error'):
+            return {"answer": f"Sorry, the query could not be run: {state['error']}"}
 
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are an AI assistant that formats database query results into a human-readable response. Give a conclusion to the user's question based on the query results. Do not give the answer in markdown format. Only give the answer in one line."),
             ("human", "User question: {question}\n\nQuery results: {results}\n\nFormatted response:"),
         ])
 
-        response = self.llm_manager.invoke(prompt, question=question, results=results)
+        response = await self.llm_manager.ainvoke(prompt, question=question, results=results_for_prompt(state))
         return {"answer": response}
 
-    def choose_visualization(self, state: dict) -> dict:
+    async def choose_visualization(self, state: dict) -> dict:
         """Choose an appropriate visualization for the data."""
         question = state['user_query']
-        results = state['results']
+        results = state.get('results')
         sql_query = state['sql_query']
 
         if results == "NOT_RELEVANT":
             return {"visualization": "none", "visualization_reasoning": "No visualization needed for irrelevant questions."}
+        if state.get('error'):
+            return {"visualization": "none", "visualization_reason": "The query could not be run."}
 
         prompt = select_visualization_prompt
 
-        response = self.llm_manager.invoke(prompt, question=question, sql_query=sql_query, results=results)
-        
-        lines = response.split('\n')
-        visualization = lines[0].split(': ')[1].strip()
-        reason = lines[1].split(': ')[1]
+        visualization, reason = await self.llm_manager.ainvoke_parsed(
+            prompt, _parse_visualization, question=question, sql_query=sql_query, results=results_for_prompt(state))
 
         return {"visualization": visualization, "visualization_reason": reason}
\ No newline at end of file
@@ -145,11 +145,11 @@ Your job:
 Behavior rules (must follow exactly):
 - ONLY output a single JSON object and nothing else (no code fences, no explanation).
 - JSON structure:
-  {
+  {{
     "valid": boolean,              // true if the final query is valid (no unresolved issues)
     "issues": string or null,      // null if none; otherwise a concise description of problems found and any automatic fixes performed
     "corrected_query": string      // the corrected PostgreSQL query (or the original if valid). If you could not produce a corrected query, put an empty string.
-  }
+  }}
 - Use the schema provided to validate identifiers. The schema will be provided as a structured text listing tables, schemas (optional), and columns. Use case-insensitive matching but return corrected identifiers using the exact casing from the schema (and double-quote them if necessary).
 - If there is insufficient information to validate or fix the query (e.g., missing schema lines), set "valid": false and explain in "issues".
 - Do not invent tables or columns that are not present in the schema.
@@ -157,25 +157,25 @@ Behavior rules (must follow exactly):
 Examples (Postgres-correct output):
 
 1) If query is already valid:
-{
+{{
   "valid": true,
   "issues": null,
   "corrected_query": "SELECT complaint_type, COUNT(*) AS count FROM \"Data_Set_t_311_Service_Requests_from_2010_to_Present\" WHERE complaint_type IS NOT NULL AND complaint_type <> 'N/A' GROUP BY complaint_type ORDER BY count DESC LIMIT 10"
-}
+}}
 
 2) If input used backticks and wrong case, and you fixed it:
-{
+{{
   "valid": true,
   "issues": "Replaced MySQL backticks with Postgres double quotes and resolved table name case using schema.",
   "corrected_query": "SELECT \"product name\", SUM(quantity * price) AS total_revenue FROM \"sales\" WHERE \"product name\" IS NOT NULL AND quantity IS NOT NULL GROUP BY \"product name\" ORDER BY total_revenue DESC"
-}
+}}
 
 3) If identifiers are missing in schema:
-{
+{{
   "valid": false,
   "issues": "Column 'gross income' not found in schema; table 'unknown_table' not found.",
   "corrected_query": ""
-}
+}}
 
 Remember: respond ONLY with the JSON object described above and nothing else.
 '''),
@@ -185,12 +185,15 @@ Remember: respond ONLY with the JSON object described above and nothing else.
 ===Generated SQL query:
 {sql_query}
 
+===Problems found by checking it against the database:
+{errors}
+
 Respond in JSON as:
-{
+{{
   "valid": boolean,
   "issues": string or null,
   "corrected_query": string
-}
+}}
 '''),
 ])
 
@@ -0,0 +1,91 @@
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List
+from core.config import RESULT_SUMMARY_MAX_TOKENS, RESULT_SUMMARY_HEAD_ROWS, RESULT_SUMMARY_TAIL_ROWS
+
+# ---------- Bounded result representation for LLM prompts ----------
+# The nodes that show query results to the LLM (answer, chart choice, chart
+# formatting) get this text instead of the raw rows: column names, row
+# count, head/tail rows and per-column statistics, cut to
+# RESULT_SUMMARY_MAX_TOKENS (about 4 characters per token), so the prompt
+# stays the same size however many rows the query returned.
+
+CHARS_PER_TOKEN = 4
+MAX_CELL_CHARS = 80
+TOP_CATEGORIES = 5
+
+
+def _cell(value: Any) -> str:
+    text = "NULL" if value is None else str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 3] + "..."
+
+def _row(row: Dict[str, Any]) -> str:
+    return " | ".join(_cell(value) for value in row.values())
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+def _column_stats(name: str, values: List[Any]) -> str:
+    present = [v for v in values if v is not None]
+    nulls = len(values) - len(present)
+    line = f"{name}:"
+    if present and all(_is_number(v) for v in present):
+        numbers = [float(v) for v in present]
+        line += f" min {min(present)}, max {max(present)}, mean {sum(numbers) / len(numbers):.4g}"
+    elif present and (all(isinstance(v, datetime) for v in present)
+                      or all(type(v) is date for v in present)):
+        line += f" from {min(present)} to {max(present)}"
+    elif present:
+        counts = Counter(_cell(v) for v in present)
+        top = ", ".join(f"{value} ({count})" for value, count in counts.most_common(TOP_CATEGORIES))
+        line += f" {len(counts)} distinct, top: {top}"
+    if nulls:
+        line += f", {nulls} null"
+    return line
+
+def _render(results: List[Dict[str, Any]], truncated: bool, head: int, tail: int, stats: List[str]) -> str:
+    columns = list(results[0].keys())
+    count = f"{len(results)}" + (" (truncated; the query returned more rows)" if truncated else "")
+    lines = [f"columns: {', '.join(columns)}", f"rows: {count}"]
+    if len(results) <= head + tail:
+        lines.extend(_row(row) for row in results)
+    else:
+        if head:
+            lines.append(f"first {head} rows:")
+            lines.extend(_row(row) for row in results[:head])
+        if tail:
+            lines.append(f"last {tail} rows:")
+            lines.extend(_row(row) for row in results[-tail:])
+    if stats:
+        lines.append("column statistics:")
+        lines.extend(stats)
+    return "\n".join(line for line in lines if line)
+
+def summarize_results(results: Any, truncated: bool = False, max_tokens: int = RESULT_SUMMARY_MAX_TOKENS) -> str:
+    """
+    Text of at most `max_tokens` (estimated) describing a result set. Small
+    results are listed in full; larger ones get head/tail rows plus per-column
+    min/max/mean or top categories, with rows dropped first when over budget.
+    """
+    if not isinstance(results, list):
+        return str(results)[:max_tokens * CHARS_PER_TOKEN]
+    if not results:
+        return "The query returned no rows."
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    head, tail = RESULT_SUMMARY_HEAD_ROWS, RESULT_SUMMARY_TAIL_ROWS
+    stats: List[str] = []
+    while True:
+        if not stats and len(results) > head + tail:
+            stats = [_column_stats(col, [row.get(col) for row in results]) for col in results[0].keys()]
+        text = _render(results, truncated, head, tail, stats)
+        if len(text) <= budget or not (head or tail):
+            break
+        # over budget: show fewer rows, keep the statistics
+        head, tail = min(head, len(results)) // 2, min(tail, len(results)) // 2
+    return text if len(text) <= budget else text[:budget - 3] + "..."
+
+def results_for_prompt(state: dict) -> str:
+    """The summary execute_sql stored in the workflow state, built here if it is missing."""
+    return state.get('results_summary') or summarize_results(state.get('results'), state.get('truncated', False))
@@ -8,10 +8,13 @@ class WorkflowState(TypedDict):
     table_id: str
     
     # Common fields (present in both Input and Output)
+    schema: str  # fetched once by understand_question, reused by the later nodes
     parsed_question: Dict[str, Any]
     unique_nouns: List[str]
     sql_query: str
     results: List[Any]
+    truncated: bool  # execute_sql stopped at the row or byte budget
+    results_summary: str  # bounded text of the results that LLM prompts get instead of the rows
     visualization: Annotated[str, operator.add]
     
     # From OutputState
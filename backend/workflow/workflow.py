@@ -2,11 +2,15 @@ from langgraph.graph import StateGraph, END
 from workflow.state import WorkflowState
 from workflow.SQLProcessor import SQLAgent
 from workflow.DataProcessor import DataProcessor
+import asyncio
+import threading
 
 class Workflow:
     def __init__(self):
         self.sql_agent = SQLAgent()
         self.data_formatter = DataProcessor()
+        # compiled once; the compiled graph holds no per-run state and is shared by all requests
+        self.graph = self.initiate_workflow().compile()
 
     def initiate_workflow(self) -> StateGraph:
         """
@@ -39,24 +43,41 @@ class Workflow:
 
         return workflow
     
-    def execute_workflow(self, user_query: str, table_id: str) -> dict:
+    async def aexecute_workflow(self, user_query: str, table_id: str) -> dict:
         """
-        Executes the workflow with the given user query and table ID.
+        Executes the workflow with the given user query and table ID. The nodes
+        are coroutines, so the LLM and database waits of concurrent requests overlap.
         """
         
-        graph = self.initiate_workflow().compile();
-
-        result = graph.invoke({
+        result = await self.graph.ainvoke({
             "user_query": user_query,
             "table_id": table_id
         })
 
         return {
             "answer": result['answer'],
+            "truncated": result.get('truncated', False),
             "visualization": result['visualization'],
-            "visualization_reason": result['visualization_reason'],
+            "visualization_reason": result.get('visualization_reason', ''),
             "formatted_data_for_visualization": result['formatted_data_for_visualization']
         }
         
+    def execute_workflow(self, user_query: str, table_id: str) -> dict:
+        """Blocking wrapper around aexecute_workflow for callers without an event loop."""
+        return asyncio.run(self.aexecute_workflow(user_query, table_id))
+
     def returnGraph(self):
-        return self.initiate_workflow().compile()
\ No newline at end of file
+        return self.graph
+
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+def get_workflow() -> Workflow:
+    """The process-wide Workflow, built (and its graph compiled) on first use."""
+    global _workflow
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                _workflow = Workflow()
+    return _workflow
\ No newline at end of file
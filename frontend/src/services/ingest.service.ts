@@ -5,6 +5,19 @@ export interface UploadResponse {
     rows_loaded: number;
 }
 
+export interface IngestJob {
+    job_id: string;
+    file_name: string;
+    stage: string;
+    rows_processed: number;
+    elapsed_seconds: number;
+    rows_per_second: number;
+    result: UploadResponse | null;
+    error: string | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
 class IngestService {
     private baseUrl: string;
 
@@ -27,8 +40,8 @@ class IngestService {
                 throw new Error(errorData.detail || 'Upload failed');
             }
 
-            const data = await response.json();
-            return data as UploadResponse;
+            const job = (await response.json()) as IngestJob;
+            return await this.waitForJob(job);
         } catch (error) {
             if (error instanceof Error) {
                 throw new Error(`File upload failed: ${error.message}`);
@@ -36,6 +49,26 @@ class IngestService {
             throw new Error('File upload failed');
         }
     }
+
+    async getJob(jobId: string): Promise<IngestJob> {
+        const response = await fetch(`${this.baseUrl}/jobs/${jobId}`);
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || 'Failed to fetch ingest job');
+        }
+        return (await response.json()) as IngestJob;
+    }
+
+    private async waitForJob(job: IngestJob): Promise<UploadResponse> {
+        while (job.stage !== 'completed' && job.stage !== 'failed') {
+            await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            job = await this.getJob(job.job_id);
+        }
+        if (job.stage === 'failed' || !job.result) {
+            throw new Error(job.error || 'Upload failed');
+        }
+        return job.result;
+    }
 }
 
 export const ingestService = new IngestService();
\ No newline at end of file